@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""Time parse_file and every section of contact.py on generated datasets of
+growing size, report the time per record, and compare against a saved
+baseline to catch regressions.
+
+Example:
+    python benchmark.py --sizes 1000,10000,100000 --save baseline.json
+    python benchmark.py --sizes 1000,10000,100000 --compare baseline.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import contact
+from contact_graph import ContactGraph
+from generate_dataset import SHAPES, generate_contacts, write_contacts
+
+
+def parse_file_by_line(file_name):
+    """Parse a contact file one line at a time from a file opened in text
+    mode, as the original parse_file did, interning names as parse_file
+    does. Kept as the baseline parse_file is timed against. The file must be
+    valid UTF-8.
+
+    Args:
+        file_name (str): name of the contact file.
+
+    Returns:
+        dic: the same dictionary parse_file returns.
+    """
+    contacts_dic = {}
+    names = {}
+    intern = names.setdefault
+    with open(file_name, encoding='utf-8') as file:
+        for line in file:
+            try:
+                patient, *contacts_list = line.rstrip().split(',')
+            except ValueError:
+                continue
+            contacts_dic[intern(patient, patient)] = [
+                intern(name, name) for name in contacts_list]
+    return contacts_dic
+
+
+def time_sections(file_name, repeat=3):
+    """Time parse_file and each find_* and pretty_print_section_* function
+    on one contact file.
+
+    Args:
+        file_name (str): name of the contact file.
+        repeat (int): number of runs of each step. The fastest is kept.
+
+    Returns:
+        dic: seconds taken by each step, in the order they ran.
+    """
+    timings = {}
+
+    def timed(name, function, *args):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function(*args)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+        return result
+
+    def printed(printer, data):
+        # printers sort in place, so each run gets its own copy
+        return lambda: printer(data.copy())
+
+    timed("parse_file_by_line", parse_file_by_line, file_name)
+    contacts_dic = timed("parse_file", contact.parse_file, file_name)
+    graph = timed("ContactGraph", ContactGraph, contacts_dic)
+    patients_zero = timed("find_patients_zero", contact.find_patients_zero,
+                          graph)
+    zombies = timed("find_potential_zombies", contact.find_potential_zombies,
+                    graph)
+    neither = timed("find_not_zombie_nor_zero",
+                    contact.find_not_zombie_nor_zero, graph, patients_zero,
+                    zombies)
+    most_viral = timed("find_most_viral", contact.find_most_viral, graph)
+    most_contacted = timed("find_most_contacted", contact.find_most_contacted,
+                           graph)
+    cycle_groups = timed("find_cycle_groups", contact.find_cycle_groups,
+                         graph)
+    heights = timed("find_maximum_distance_from_zombie",
+                    contact.find_maximum_distance_from_zombie, graph, zombies)
+    timed("classify_zombies", contact.classify_zombies, graph, zombies)
+    spreader = timed("find_spreader_zombies", contact.find_spreader_zombies,
+                     graph, zombies)
+    regular = timed("find_regular_zombies", contact.find_regular_zombies,
+                    graph, zombies)
+    predator = timed("find_predator_zombies", contact.find_predator_zombies,
+                     graph, zombies)
+
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        timed("pretty_print_section_4", contact.pretty_print_section_4,
+              contacts_dic)
+        for section, data in ((5, patients_zero), (6, zombies), (7, neither),
+                              (8, most_viral), (9, most_contacted),
+                              (11, spreader), (12, regular),
+                              (13, predator), (14, cycle_groups)):
+            printer = getattr(contact, f"pretty_print_section_{section}")
+            timed(f"pretty_print_section_{section}", printed(printer, data))
+        timed("pretty_print_section_10", contact.pretty_print_section_10,
+              heights)
+
+    return timings
+
+
+def run_benchmarks(sizes, shape="powerlaw", num_cycles=0, repeat=3, seed=0):
+    """Generate a dataset of each size and time every step on it.
+
+    Args:
+        sizes (list): numbers of records to benchmark.
+        shape (str): dataset shape, as accepted by generate_contacts.
+        num_cycles (int): number of loops to plant in each dataset.
+        repeat (int): number of runs of each step.
+        seed (int): seed for the generated data.
+
+    Returns:
+        dic: the benchmark settings and, for each size, the seconds and
+        microseconds per record taken by each step.
+    """
+    results = {"shape": shape, "cycles": num_cycles, "runs": {}}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            file_name = os.path.join(directory, f"contacts-{size}.txt")
+            write_contacts(file_name, generate_contacts(size, shape,
+                                                        num_cycles, seed))
+            seconds = time_sections(file_name, repeat)
+            results["runs"][str(size)] = {
+                "records": size,
+                "seconds": seconds,
+                "us_per_record": {name: 1e6 * elapsed / size
+                                  for name, elapsed in seconds.items()},
+            }
+
+    return results
+
+
+def find_regressions(results, baseline, tolerance=1.25, min_seconds=1e-3):
+    """Compare a benchmark run against a stored one.
+
+    Args:
+        results (dic): the current run, as returned by run_benchmarks.
+        baseline (dic): an earlier run of the same settings.
+        tolerance (float): how many times slower per record a step may get.
+        min_seconds (float): steps faster than this are too noisy to judge.
+
+    Returns:
+        list: (size, step, baseline, current) microseconds per record for
+        every step that got slower than allowed.
+    """
+    regressions = []
+    for size, run in results["runs"].items():
+        old_run = baseline.get("runs", {}).get(size)
+        if old_run is None:
+            continue
+        for name, current in run["us_per_record"].items():
+            old = old_run["us_per_record"].get(name)
+            if (old is not None and current > old * tolerance
+                    and run["seconds"][name] >= min_seconds):
+                regressions.append((size, name, old, current))
+    return regressions
+
+
+def print_report(results, out=sys.stdout):
+    """Print microseconds per record for each step and size as a table."""
+    sizes = list(results["runs"])
+    names = list(results["runs"][sizes[-1]]["us_per_record"]) if sizes else []
+    width = max(map(len, names), default=4)
+
+    print(f"{'us/record':<{width}}" +
+          "".join(f"{size:>12}" for size in sizes), file=out)
+    for name in names:
+        cells = (results["runs"][size]["us_per_record"].get(name)
+                 for size in sizes)
+        print(f"{name:<{width}}" +
+              "".join("           -" if cell is None else f"{cell:12.3f}"
+                      for cell in cells), file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark each section of contact.py.")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="comma separated numbers of records")
+    parser.add_argument("--shape", choices=SHAPES, default="powerlaw")
+    parser.add_argument("--cycles", type=int, default=0,
+                        help="number of loops to plant in each dataset")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", metavar="FILE",
+                        help="write the results as JSON")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="flag steps slower than this saved run")
+    parser.add_argument("--tolerance", type=float, default=1.25,
+                        help="allowed slowdown per record when comparing")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = run_benchmarks(sizes, args.shape, args.cycles, args.repeat,
+                             args.seed)
+    print_report(results)
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for size, name, old, current in regressions:
+            print(f"REGRESSION {name} at {size} records: "
+                  f"{old:.3f} -> {current:.3f} us/record")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Analyse many contact files at once, one process per file, writing a
+<name>-out.txt report next to each input (or into a chosen directory) and
+printing how long each file took. Existing reports are left alone unless
+--force is given.
+
+Example:
+    python contact_batch.py "DataSet*.txt" --output-dir reports/
+    python contact_batch.py regions/ --output-dir reports/ -j 8
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import contact
+from contact_io import GRAPH_CACHE_SUFFIX
+
+OUTPUT_SUFFIX = "-out"
+# Suffixes of the compressed files contact_io reads transparently.
+COMPRESSION_SUFFIXES = (".gz", ".bz2", ".xz")
+
+
+def _strip_compression(file_name):
+    """Return a file name without its compression suffix, if any."""
+    root, ext = os.path.splitext(file_name)
+    return root if ext in COMPRESSION_SUFFIXES else file_name
+
+
+def output_name(file_name, output_dir=None):
+    """Return the name of the report for an input file: DataSet1.txt gives
+    DataSet1-out.txt. Reports are plain text, so DataSet1.txt.gz gives
+    DataSet1-out.txt too.
+
+    Args:
+        file_name (str): name of the contact file.
+        output_dir (str): directory for the report. Defaults to the input's
+        directory.
+
+    Returns:
+        str: name of the report file.
+    """
+    root, ext = os.path.splitext(_strip_compression(file_name))
+    if output_dir is not None:
+        root = os.path.join(output_dir, os.path.basename(root))
+    return root + OUTPUT_SUFFIX + ext
+
+
+def expand_inputs(patterns):
+    """Turn glob patterns and directories into a sorted list of contact
+    files. Reports and graph caches are left out, so "DataSet*.txt" does not
+    pick up DataSet1-out.txt.
+
+    Args:
+        patterns (list): glob patterns, file names or directories. Every
+        .txt file in a directory is included, compressed or not.
+
+    Returns:
+        list: names of the contact files, without duplicates.
+    """
+    file_names = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            globs = [os.path.join(pattern, "*.txt" + suffix)
+                     for suffix in ("", *COMPRESSION_SUFFIXES)]
+        else:
+            globs = [pattern]
+        for file_name in (name for each in globs for name in glob.glob(each)):
+            root = os.path.splitext(_strip_compression(file_name))[0]
+            if (os.path.isfile(file_name)
+                    and not root.endswith(OUTPUT_SUFFIX)
+                    and not file_name.endswith(GRAPH_CACHE_SUFFIX)):
+                file_names.add(file_name)
+    return sorted(file_names)
+
+
+def analyse_to_file(file_name, output_dir=None, use_cache=False,
+                    backend="python", force=False):
+    """Write the report for one contact file. Runs in a worker process. An
+    existing report is only replaced if force is set.
+
+    Returns:
+        dic: the input and report names, the number of sick people, the
+        seconds taken, and an error message if the file could not be
+        analysed.
+    """
+    result = {"file": file_name, "output": output_name(file_name, output_dir),
+              "records": None, "seconds": 0.0, "error": None}
+    start = time.perf_counter()
+    try:
+        with open(result["output"], 'w' if force else 'x') as out:
+            result["records"] = contact.write_report(
+                file_name, out, use_cache=use_cache, backend=backend)
+    except FileExistsError:
+        result["error"] = (f"{result['output']} already exists "
+                           "(use --force to replace it)")
+    except (OSError, ValueError) as error:
+        result["error"] = str(error)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def run_batch(file_names, workers=None, output_dir=None, use_cache=False,
+              backend="python", force=False):
+    """Analyse contact files in a pool of processes.
+
+    Args:
+        file_names (list): names of the contact files.
+        workers (int): number of processes. Defaults to one per CPU.
+        output_dir (str): directory for the reports. Defaults to each
+        input's directory.
+        use_cache (bool): use the binary graph cache for each input.
+        backend (str): "python" or "numpy".
+        force (bool): replace reports that already exist.
+
+    Returns:
+        list: the result of analyse_to_file for each file, in input order.
+    """
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    if not file_names:
+        return []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(analyse_to_file, file_name, output_dir,
+                                   use_cache, backend, force)
+                   for file_name in file_names]
+        return [future.result() for future in futures]
+
+
+def print_summary(results, wall_seconds, out=None):
+    """Print the time taken for each file and for the whole batch."""
+    width = max((len(result["file"]) for result in results), default=4)
+    print(f"{'file':<{width}}  {'records':>10}  {'seconds':>9}", file=out)
+    for result in results:
+        if result["error"]:
+            print(f"{result['file']:<{width}}  FAILED: {result['error']}",
+                  file=out)
+        else:
+            print(f"{result['file']:<{width}}  {result['records']:>10}  "
+                  f"{result['seconds']:>9.3f}", file=out)
+
+    busy = sum(result["seconds"] for result in results)
+    print(f"{len(results)} files in {wall_seconds:.3f} s "
+          f"({busy:.3f} s of work)", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write a report for every contact file matched.")
+    parser.add_argument("inputs", nargs="+",
+                        help="glob patterns, files or directories")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="number of processes (default: one per CPU)")
+    parser.add_argument("-o", "--output-dir",
+                        help="write the reports here instead of next to "
+                             "each input")
+    parser.add_argument("--cache", action="store_true",
+                        help="use the binary graph cache for each input")
+    parser.add_argument("--backend", choices=("python", "numpy"),
+                        default="python")
+    parser.add_argument("--force", action="store_true",
+                        help="replace reports that already exist")
+    args = parser.parse_args()
+
+    file_names = expand_inputs(args.inputs)
+    if not file_names:
+        print("No input files found.")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    results = run_batch(file_names, args.workers, args.output_dir,
+                        args.cache, args.backend, args.force)
+    print_summary(results, time.perf_counter() - start)
+
+    if any(result["error"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
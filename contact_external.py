@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""Analyse contact files too large to hold in memory.
+
+Sections 5 to 9 only need three numbers per person: whether they have their
+own record, how long their contact list is, and how many times they are
+listed. These are computed with an external sort in two passes, each
+keeping at most about memory_budget bytes of entries in memory and spilling
+sorted runs to temporary files that are then merged with heapq.merge:
+
+1. Records are sorted by patient and line number, so merging the runs
+   brings every record of a patient together and the last one wins, as it
+   does in parse_file.
+2. The winning records are counted per name in a dictionary that is
+   spilled in name order whenever it outgrows the budget. Merging these
+   runs adds up the counts of each name.
+
+At most _MAX_MERGE_RUNS run files are merged at once; more runs are first
+merged in groups into longer runs, so the number of open files stays
+bounded however large the input is.
+
+The budget covers the records and counts, not the result: the names that
+sections 5 to 9 print are returned as lists, which are needed whole to be
+formatted. Sections 5, 6 and 7 together name every person, so these lists
+still grow with the number of people in the file.
+"""
+
+import heapq
+import os
+import pickle
+import sys
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+
+from contact_io import iter_contact_records
+
+DEFAULT_MEMORY_BUDGET = 64 << 20
+OUT_OF_CORE_SECTIONS = (5, 6, 7, 8, 9)
+
+_RUN_BLOCK = 4096       # entries pickled together in a run file
+_MAX_MERGE_RUNS = 64    # run files a merge keeps open at once
+_ENTRY_BYTES = 120      # rough size of a buffered tuple and its list
+
+
+def _write_run(entries, directory):
+    """Write sorted entries, from any iterable, to a new run file.
+
+    Returns:
+        str: name of the run file.
+    """
+    descriptor, path = tempfile.mkstemp(suffix=".run", dir=directory)
+    with os.fdopen(descriptor, 'wb') as file:
+        block = []
+        for entry in entries:
+            block.append(entry)
+            if len(block) == _RUN_BLOCK:
+                pickle.dump(block, file, pickle.HIGHEST_PROTOCOL)
+                block = []
+        if block:
+            pickle.dump(block, file, pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def _spill(entries, directory):
+    """Sort entries and write them to a new run file.
+
+    Returns:
+        str: name of the run file.
+    """
+    entries.sort()
+    return _write_run(entries, directory)
+
+
+def _read_run(path):
+    """Yield the entries of a run file in order."""
+    with open(path, 'rb') as file:
+        while True:
+            try:
+                block = pickle.load(file)
+            except EOFError:
+                return
+            yield from block
+
+
+def _merge_runs(runs, entries, directory):
+    """Merge run files with a last batch of entries that was never spilled.
+
+    At most _MAX_MERGE_RUNS files are open at once: while there are more
+    runs than that, groups of them are merged into longer runs first, so
+    the number of open files does not grow with the size of the input.
+    """
+    runs = list(runs)
+    while len(runs) > _MAX_MERGE_RUNS:
+        group, runs = runs[:_MAX_MERGE_RUNS], runs[_MAX_MERGE_RUNS:]
+        runs.append(_write_run(heapq.merge(*map(_read_run, group)),
+                               directory))
+        for path in group:
+            os.remove(path)
+
+    entries.sort()
+    return heapq.merge(*map(_read_run, runs), entries)
+
+
+def _last_records(records, memory_budget, directory):
+    """Yield the last record of each patient, in patient order."""
+    runs = []
+    entries = []
+    used = 0
+    getsize = sys.getsizeof
+
+    for line, (patient, contacts_list) in enumerate(records):
+        # the line number breaks ties, so contact lists are never compared
+        entries.append((patient, line, contacts_list))
+        used += (_ENTRY_BYTES + getsize(patient)
+                 + sum(map(getsize, contacts_list)))
+        if used >= memory_budget:
+            runs.append(_spill(entries, directory))
+            entries = []
+            used = 0
+
+    for patient, group in groupby(_merge_runs(runs, entries, directory),
+                                  key=itemgetter(0)):
+        *_, (_, _, contacts_list) = group
+        yield patient, contacts_list
+
+
+def _count_names(records, memory_budget, directory):
+    """Count the winning records per name and return the merged runs of
+    (name, out_degree, in_degree) entries, in name order. A name may have an
+    entry in several runs. out_degree is -1 for names without a record of
+    their own."""
+    runs = []
+    counts = {}
+    used = 0
+    getsize = sys.getsizeof
+
+    def spill():
+        nonlocal counts, used
+        runs.append(_spill([(name, out_degree, in_degree)
+                            for name, (out_degree, in_degree)
+                            in counts.items()], directory))
+        counts = {}
+        used = 0
+
+    for patient, contacts_list in records:
+        entry = counts.get(patient)
+        if entry is None:
+            counts[patient] = [len(contacts_list), 0]
+            used += _ENTRY_BYTES + getsize(patient)
+        else:
+            entry[0] = len(contacts_list)
+        for name in contacts_list:
+            entry = counts.get(name)
+            if entry is None:
+                counts[name] = [-1, 1]
+                used += _ENTRY_BYTES + getsize(name)
+            else:
+                entry[1] += 1
+        if used >= memory_budget:
+            spill()
+
+    return _merge_runs(runs, [(name, out_degree, in_degree)
+                              for name, (out_degree, in_degree)
+                              in counts.items()], directory)
+
+
+def iter_name_degrees(file_name, memory_budget=DEFAULT_MEMORY_BUDGET,
+                      temp_dir=None, on_error=None):
+    """Yield every person in a contact file with their degrees, in name
+    order, without indexing the file in memory.
+
+    Args:
+        file_name (str): name of the contact file.
+        memory_budget (int): about how many bytes of records and counts are
+        held before a run is spilled to disk.
+        temp_dir (str): where the runs are written. Defaults to the
+        system's temporary directory.
+        on_error (callable): called for every line that cannot be read.
+
+    Yields:
+        tuple: the name, the length of their contact list (None if they
+        have no record of their own) and the number of times they are
+        listed, as ContactGraph's out_degree and in_degree.
+    """
+    records = iter_contact_records(file_name, on_error, intern_names=False)
+    with tempfile.TemporaryDirectory(prefix="contact-runs-",
+                                     dir=temp_dir) as directory:
+        last_records = _last_records(records, memory_budget, directory)
+        merged = _count_names(last_records, memory_budget, directory)
+        for name, group in groupby(merged, key=itemgetter(0)):
+            out_degree = -1
+            in_degree = 0
+            for _, run_out_degree, run_in_degree in group:
+                out_degree = max(out_degree, run_out_degree)
+                in_degree += run_in_degree
+            yield name, (None if out_degree < 0 else out_degree), in_degree
+
+
+def analyse_out_of_core(file_name, memory_budget=DEFAULT_MEMORY_BUDGET,
+                        temp_dir=None, on_error=None):
+    """Compute sections 5 to 9 of a contact file within a memory budget.
+
+    Args:
+        file_name (str): name of the contact file.
+        memory_budget (int): as for iter_name_degrees.
+        temp_dir (str): as for iter_name_degrees.
+        on_error (callable): called for every line that cannot be read.
+
+    Returns:
+        dic: for each of OUT_OF_CORE_SECTIONS, the list of names that
+        find_patients_zero, find_potential_zombies, find_not_zombie_nor_zero,
+        find_most_viral and find_most_contacted return, in name order.
+    """
+    patients_zero, zombies, neither = [], [], []
+    most_viral, max_out_degree = [], 0
+    most_contacted, max_in_degree = [], 0
+
+    for name, out_degree, in_degree in iter_name_degrees(
+            file_name, memory_budget, temp_dir, on_error):
+        if out_degree is None:
+            zombies.append(name)
+        else:
+            (neither if in_degree else patients_zero).append(name)
+            if out_degree > max_out_degree:
+                max_out_degree = out_degree
+                most_viral = [name]
+            elif out_degree == max_out_degree:
+                most_viral.append(name)
+
+        if in_degree:
+            if in_degree > max_in_degree:
+                max_in_degree = in_degree
+                most_contacted = [name]
+            elif in_degree == max_in_degree:
+                most_contacted.append(name)
+
+    return {5: patients_zero, 6: zombies, 7: neither, 8: most_viral,
+            9: most_contacted}
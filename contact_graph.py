@@ -0,0 +1,870 @@
+#!/usr/bin/env python3
+"""Index a dictionary of sick people and their contacts once, so that every
+analysis section can read the same patient set, contact set, degree tables
+and reverse adjacency instead of rebuilding them from the raw dictionary.
+"""
+
+import heapq
+from bisect import bisect_left
+from types import MappingProxyType
+
+
+class ContactGraph:
+    """Read-only index over a contact tracing dictionary.
+
+    Attributes:
+        adjacency (mapping): each entry is a sick person's name (key) and
+        their list of contacts, exactly as returned by parse_file.
+        patients (frozenset): names of everyone with their own contact list.
+        contacts (frozenset): names of everyone appearing in a contact list.
+        out_degree (mapping): length of each sick person's contact list.
+        in_degree (mapping): number of times each contact appears across all
+        contact lists.
+        reverse (mapping): for each contact, the sick people who listed them
+        (one entry per appearance).
+    """
+
+    __slots__ = ("adjacency", "patients", "contacts", "out_degree",
+                 "in_degree", "reverse")
+
+    def __init__(self, contacts_dic):
+        """Build every index in a single pass over the contact lists.
+
+        Args:
+            contacts_dic (dic): each entry is a sick person's name and their
+            list of contacts. The dictionary is referenced, not copied.
+        """
+        out_degree = {}
+        in_degree = {}
+        reverse = {}
+
+        for patient, contacts_list in contacts_dic.items():
+            out_degree[patient] = len(contacts_list)
+            for contact in contacts_list:
+                in_degree[contact] = in_degree.get(contact, 0) + 1
+                reverse.setdefault(contact, []).append(patient)
+
+        set_attr = object.__setattr__
+        set_attr(self, "adjacency", MappingProxyType(contacts_dic))
+        set_attr(self, "patients", frozenset(contacts_dic))
+        set_attr(self, "contacts", frozenset(in_degree))
+        set_attr(self, "out_degree", MappingProxyType(out_degree))
+        set_attr(self, "in_degree", MappingProxyType(in_degree))
+        set_attr(self, "reverse", MappingProxyType(reverse))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ContactGraph is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("ContactGraph is immutable")
+
+    def __len__(self):
+        return len(self.adjacency)
+
+
+def as_contact_graph(contacts):
+    """Return contacts as a ContactGraph, indexing it only if necessary.
+
+    Args:
+        contacts (ContactGraph or dic): an existing index, or a dictionary of
+        sick people and their contacts.
+
+    Returns:
+        ContactGraph: the index for contacts.
+    """
+    if isinstance(contacts, ContactGraph):
+        return contacts
+    return ContactGraph(contacts)
+
+
+def _by_degree(item):
+    """Sort key putting the largest degree first and ties in name order."""
+    return -item[1], item[0]
+
+
+def top_k_by_degree(degree_table, k):
+    """Return the k names with the largest degree using a heap of size k.
+
+    Args:
+        degree_table (mapping): degree of each name, such as the out_degree
+        or in_degree of a ContactGraph.
+        k (int): number of names wanted.
+
+    Returns:
+        list: up to k (name, degree) pairs, largest degree first and ties in
+        name order. Ties at the k-th place are cut off by name.
+
+    Raises:
+        ValueError: if k is negative.
+    """
+    if k < 0:
+        raise ValueError(f"k must not be negative, got {k}")
+    return heapq.nsmallest(k, degree_table.items(), key=_by_degree)
+
+
+class DegreeRanking:
+    """Index over a degree table for repeated top-k and rank queries.
+
+    Building the index sorts the table once. After that top(k) costs O(k)
+    and rank(name) costs O(log n).
+    """
+
+    def __init__(self, degree_table):
+        """Sort the names by degree.
+
+        Args:
+            degree_table (mapping): degree of each name, such as the
+            out_degree or in_degree of a ContactGraph.
+        """
+        self._degrees = degree_table
+        self._ranked = sorted(degree_table.items(), key=_by_degree)
+        # negated so the list ascends and bisect can search it
+        self._negated = [-degree for _, degree in self._ranked]
+
+    def __len__(self):
+        return len(self._ranked)
+
+    def top(self, k):
+        """Return the k names with the largest degree.
+
+        Returns:
+            list: up to k (name, degree) pairs, largest degree first and ties
+            in name order.
+
+        Raises:
+            ValueError: if k is negative.
+        """
+        if k < 0:
+            raise ValueError(f"k must not be negative, got {k}")
+        return self._ranked[:k]
+
+    def rank(self, name):
+        """Return name's rank: one more than the number of names with a
+        strictly larger degree, so tied names share a rank.
+
+        Raises:
+            KeyError: if name is not in the table.
+        """
+        return bisect_left(self._negated, -self._degrees[name]) + 1
+
+
+def breadth_first_distances(neighbours, sources):
+    """Find the fewest steps from any of several sources to every person
+    reachable from them, visiting each person and each link at most once.
+    Cycles need no special care: a person is settled the first time they are
+    reached.
+
+    Args:
+        neighbours (mapping): each person's list of next people. People
+        without an entry have none.
+        sources (iterable): the people at distance 0.
+
+    Returns:
+        dic: the distance of every reachable person, in the order they were
+        reached. People who cannot be reached are left out.
+    """
+    distances = dict.fromkeys(sources, 0)
+    frontier = list(distances)
+    distance = 0
+
+    while frontier:
+        distance += 1
+        next_frontier = []
+        for person in frontier:
+            for neighbour in neighbours.get(person, ()):
+                if neighbour not in distances:
+                    distances[neighbour] = distance
+                    next_frontier.append(neighbour)
+        frontier = next_frontier
+
+    return distances
+
+
+def strongly_connected_components(adjacency):
+    """Split a contact graph into strongly connected components using an
+    iterative version of Tarjan's algorithm, so long contact chains cannot
+    exhaust the recursion limit.
+
+    Args:
+        adjacency (mapping): each entry is a sick person's name and their
+        list of contacts. Contacts without an entry of their own are treated
+        as having no contacts.
+
+    Returns:
+        list: one list of names per component. A component is only listed
+        after every component reachable from it, so the result is in reverse
+        topological order.
+    """
+    index = {}              # order in which each person was first reached
+    lowlink = {}            # lowest index reachable from each person
+    on_stack = set()
+    stack = []
+    components = []
+
+    for root in adjacency:
+        if root in index:
+            continue
+
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(adjacency[root]))]
+
+        while work:
+            person, contacts = work[-1]
+            for contact in contacts:
+                if contact not in index:
+                    # descend into the contact before finishing this person
+                    index[contact] = lowlink[contact] = len(index)
+                    stack.append(contact)
+                    on_stack.add(contact)
+                    work.append((contact, iter(adjacency.get(contact, ()))))
+                    break
+                if contact in on_stack and index[contact] < lowlink[person]:
+                    lowlink[person] = index[contact]
+            else:
+                # every contact has been explored
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if lowlink[person] < lowlink[parent]:
+                        lowlink[parent] = lowlink[person]
+
+                if lowlink[person] == index[person]:
+                    # person is the root of a component: pop its members
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == person:
+                            break
+                    components.append(component)
+
+    return components
+
+
+def condensation_heights(adjacency):
+    """Find each person's maximum distance from a zombie on the condensation
+    of a contact graph, where every strongly connected component is one
+    node. Every member of a component gets the component's height, so a
+    cycle costs its members nothing more than being one person. Takes time
+    linear in the size of the graph.
+
+    Args:
+        adjacency (mapping): each entry is a sick person's name and their
+        list of contacts.
+
+    Returns:
+        dic: the height of every person in the graph, in no particular order.
+    """
+    component_of = {}
+    component_heights = []
+
+    # every component comes after the components its members' contacts are
+    # in, so their heights are known by the time it is reached
+    for number, component in enumerate(
+            strongly_connected_components(adjacency)):
+        for member in component:
+            component_of[member] = number
+        height = 0
+        for member in component:
+            for contact in adjacency.get(member, ()):
+                other = component_of[contact]
+                if other != number and component_heights[other] >= height:
+                    height = component_heights[other] + 1
+        component_heights.append(height)
+
+    return {name: component_heights[number]
+            for name, number in component_of.items()}
+
+
+class _DegreeBuckets:
+    """Group names by degree and keep track of the largest degree, so the
+    names with the largest degree can be found without a scan."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.max_degree = None
+
+    def move(self, name, old, new):
+        """Move name from degree old to degree new. None means absent."""
+        buckets = self.buckets
+        if old is not None:
+            bucket = buckets[old]
+            bucket.discard(name)
+            if not bucket:
+                del buckets[old]
+        if new is not None:
+            buckets.setdefault(new, set()).add(name)
+            if self.max_degree is None or new > self.max_degree:
+                self.max_degree = new
+
+        # walk the maximum down to the next degree anyone still has
+        if not buckets:
+            self.max_degree = None
+        else:
+            while self.max_degree not in buckets:
+                self.max_degree -= 1
+
+    def top(self):
+        """Return the names with the largest degree."""
+        if self.max_degree is None:
+            return []
+        return list(self.buckets[self.max_degree])
+
+
+def _largest(degree_table, default):
+    """Return the largest degree in a table and the names that have it."""
+    maximum = max(degree_table.values(), default=default)
+    return maximum, {name for name, degree in degree_table.items()
+                     if degree == maximum}
+
+
+class ContactStatistics:
+    """Running answers to sections 5 to 9, updated one record at a time so
+    they are ready as soon as the last line of a file has been parsed.
+
+    Only degree counters and membership sets are kept, not the contact
+    lists: a record that replaces an earlier one for the same person must
+    be given the earlier list, as parse_file does. The most viral and most
+    contacted people are tracked as degrees grow. If a replaced record
+    takes the last person off a maximum, that maximum is found again by
+    one scan of its degree table the next time it is asked for.
+
+    Attributes:
+        out_degree (dic): length of each sick person's contact list.
+        in_degree (dic): number of times each contact appears across all
+        contact lists.
+    """
+
+    def __init__(self):
+        self.out_degree = {}
+        self.in_degree = {}
+        self._patients_zero = set()
+        self._potential_zombies = set()
+        self._not_zombie_nor_zero = set()
+        # the names at each maximum, or None when it must be found again
+        self._max_out_degree, self._most_viral = -1, set()
+        self._max_in_degree, self._most_contacted = 0, set()
+
+    def add_record(self, patient, contacts_list, replaced=None):
+        """Count a sick person's record.
+
+        Args:
+            patient (str): the sick person's name.
+            contacts_list (list): names of the people they had contact with.
+            replaced (list): the contacts of the earlier record this one
+            replaces, if there is one.
+        """
+        if replaced is not None:
+            self._remove(patient, replaced)
+        elif patient in self.in_degree:
+            # a potential zombie has turned out to be sick
+            self._potential_zombies.discard(patient)
+            self._not_zombie_nor_zero.add(patient)
+        else:
+            self._patients_zero.add(patient)
+
+        degree = self.out_degree[patient] = len(contacts_list)
+        if self._most_viral is not None:
+            if degree > self._max_out_degree:
+                self._max_out_degree, self._most_viral = degree, {patient}
+            elif degree == self._max_out_degree:
+                self._most_viral.add(patient)
+
+        out_degree = self.out_degree
+        in_degree = self.in_degree
+        max_in_degree = self._max_in_degree
+        most_contacted = self._most_contacted
+        for contact in contacts_list:
+            count = in_degree.get(contact, 0) + 1
+            in_degree[contact] = count
+            if count == 1:
+                if contact in out_degree:
+                    self._patients_zero.discard(contact)
+                    self._not_zombie_nor_zero.add(contact)
+                else:
+                    self._potential_zombies.add(contact)
+            if most_contacted is not None and count >= max_in_degree:
+                if count > max_in_degree:
+                    max_in_degree, most_contacted = count, {contact}
+                else:
+                    most_contacted.add(contact)
+        self._max_in_degree = max_in_degree
+        self._most_contacted = most_contacted
+
+    def _remove(self, patient, contacts_list):
+        """Take back the counts of a record that is being replaced."""
+        if (self._most_viral is not None
+                and self.out_degree[patient] == self._max_out_degree):
+            self._most_viral.discard(patient)
+            if not self._most_viral:
+                self._most_viral = None
+
+        in_degree = self.in_degree
+        for contact in contacts_list:
+            count = in_degree[contact] - 1
+            if (self._most_contacted is not None
+                    and count + 1 == self._max_in_degree):
+                self._most_contacted.discard(contact)
+                if not self._most_contacted:
+                    self._most_contacted = None
+            if count:
+                in_degree[contact] = count
+                continue
+
+            del in_degree[contact]
+            if contact in self.out_degree:
+                self._not_zombie_nor_zero.discard(contact)
+                self._patients_zero.add(contact)
+            else:
+                self._potential_zombies.discard(contact)
+
+    def patients_zero(self):
+        """Return the sick people who appear in no contact list."""
+        return list(self._patients_zero)
+
+    def potential_zombies(self):
+        """Return the contacts who have no record of their own."""
+        return list(self._potential_zombies)
+
+    def not_zombie_nor_zero(self):
+        """Return the sick people who appear in someone's contact list."""
+        return list(self._not_zombie_nor_zero)
+
+    def most_viral(self):
+        """Return the sick people with the largest contact lists."""
+        if self._most_viral is None:
+            self._max_out_degree, self._most_viral = _largest(
+                self.out_degree, -1)
+        return list(self._most_viral)
+
+    def most_contacted(self):
+        """Return the contacts who appear in the most contact lists."""
+        if self._most_contacted is None:
+            self._max_in_degree, self._most_contacted = _largest(
+                self.in_degree, 0)
+        return list(self._most_contacted)
+
+
+class DynamicContactGraph:
+    """Contact graph that accepts corrections and keeps the analysis results
+    up to date as they arrive.
+
+    Patient zeros, potential zombies, the most viral and most contacted
+    people and the spreader, regular and predator zombies are maintained on
+    every update, at a cost proportional to the contacts that changed.
+    Heights are cached: an update only invalidates the changed person and
+    their ancestors, which are recomputed the next time heights are asked
+    for.
+
+    Attributes:
+        adjacency (dic): each entry is a sick person's name and their list
+        of contacts. Change it only through the methods below.
+        in_degree (dic): number of times each contact appears across all
+        contact lists.
+        reverse (dic): for each contact, the sick people who listed them and
+        how many times.
+    """
+
+    def __init__(self, contacts_dic=None):
+        """Create a graph, optionally loaded with existing records.
+
+        Args:
+            contacts_dic (dic): each entry is a sick person's name and their
+            list of contacts.
+        """
+        self.adjacency = {}
+        self.in_degree = {}
+        self.reverse = {}
+        self._patients_zero = set()
+        self._potential_zombies = set()
+        self._out_degrees = _DegreeBuckets()
+        self._in_degrees = _DegreeBuckets()
+        # per sick person, the contacts who have no record of their own
+        self._zombie_contacts = {}
+        self._spreader = set()
+        self._regular = set()
+        self._predator = set()
+        self._heights = {}
+        self._dirty = set()
+
+        for patient, contacts_list in (contacts_dic or {}).items():
+            self.add_record(patient, contacts_list)
+
+    def __len__(self):
+        return len(self.adjacency)
+
+    # Updates
+
+    def add_record(self, patient, contacts_list):
+        """Add a sick person's record. An existing record for the same person
+        is replaced, as a later line in a contact file would replace it.
+
+        Args:
+            patient (str): the sick person's name.
+            contacts_list (list): names of the people they had contact with.
+        """
+        contacts_list = list(contacts_list)
+        if patient in self.adjacency:
+            old_degree = len(self.adjacency[patient])
+            for contact in self.adjacency[patient]:
+                self._unlink(patient, contact)
+        else:
+            old_degree = None
+            self._add_patient(patient)
+
+        self.adjacency[patient] = contacts_list
+        for contact in contacts_list:
+            self._link(patient, contact)
+        self._updated(patient, old_degree)
+
+    def add_contact(self, patient, contact):
+        """Add one contact to a sick person's record, creating the record if
+        necessary.
+
+        Args:
+            patient (str): the sick person's name.
+            contact (str): the name of the person they had contact with.
+        """
+        if patient not in self.adjacency:
+            self.add_record(patient, [contact])
+            return
+
+        contacts_list = self.adjacency[patient]
+        contacts_list.append(contact)
+        self._link(patient, contact)
+        self._updated(patient, len(contacts_list) - 1)
+
+    def remove_contact(self, patient, contact):
+        """Retract one appearance of a contact from a sick person's record.
+
+        Args:
+            patient (str): the sick person's name.
+            contact (str): the name of the contact to retract.
+
+        Raises:
+            KeyError: if patient has no record.
+            ValueError: if contact is not in patient's record.
+        """
+        contacts_list = self.adjacency[patient]
+        contacts_list.remove(contact)
+        self._unlink(patient, contact)
+        self._updated(patient, len(contacts_list) + 1)
+
+    def remove_patient(self, patient):
+        """Remove a sick person's record. If others listed them, they remain
+        in the graph as a potential zombie.
+
+        Args:
+            patient (str): the sick person's name.
+
+        Raises:
+            KeyError: if patient has no record.
+        """
+        contacts_list = self.adjacency[patient]
+        for contact in contacts_list:
+            self._unlink(patient, contact)
+
+        del self.adjacency[patient]
+        del self._zombie_contacts[patient]
+        self._out_degrees.move(patient, len(contacts_list), None)
+        self._patients_zero.discard(patient)
+        for zombie_type in (self._spreader, self._regular, self._predator):
+            zombie_type.discard(patient)
+
+        if patient in self.in_degree:
+            # still listed by others, so now a potential zombie
+            self._potential_zombies.add(patient)
+            for parent, count in self.reverse[patient].items():
+                self._zombie_contacts[parent] += count
+                self._classify(parent)
+            self._invalidate(patient)
+        else:
+            self._heights.pop(patient, None)
+            self._dirty.discard(patient)
+
+    # Queries
+
+    def patients_zero(self):
+        """Return the sick people who appear in no contact list."""
+        return list(self._patients_zero)
+
+    def potential_zombies(self):
+        """Return the contacts who have no record of their own."""
+        return list(self._potential_zombies)
+
+    def most_viral(self):
+        """Return the sick people with the largest contact lists."""
+        return self._out_degrees.top()
+
+    def most_contacted(self):
+        """Return the contacts who appear in the most contact lists."""
+        return self._in_degrees.top()
+
+    def spreader_zombies(self):
+        """Return the sick people who only had contact with potential
+        zombies."""
+        return list(self._spreader)
+
+    def regular_zombies(self):
+        """Return the sick people who had contact with both potential zombies
+        and other sick people."""
+        return list(self._regular)
+
+    def predator_zombies(self):
+        """Return the sick people who only had contact with other sick
+        people."""
+        return list(self._predator)
+
+    def height(self, name):
+        """Return the maximum distance from name to a potential zombie.
+
+        Raises:
+            KeyError: if name is not in the graph.
+            ValueError: if name's heights depend on a cycle.
+        """
+        self._settle_heights()
+        return self._heights[name]
+
+    def heights(self):
+        """Return everyone's maximum distance from a potential zombie, in
+        the same order as find_maximum_distance_from_zombie.
+
+        Raises:
+            ValueError: if the contacts contain a cycle.
+        """
+        self._settle_heights()
+        return dict(sorted(self._heights.items(),
+                           key=lambda item: (-item[1], item[0])))
+
+    # Bookkeeping
+
+    def _add_patient(self, patient):
+        """Register a new sick person with an empty record."""
+        self.adjacency[patient] = []
+        self._zombie_contacts[patient] = 0
+
+        if patient in self.in_degree:
+            # a potential zombie has turned out to be sick
+            self._potential_zombies.discard(patient)
+            for parent, count in self.reverse[patient].items():
+                self._zombie_contacts[parent] -= count
+                self._classify(parent)
+        else:
+            self._patients_zero.add(patient)
+
+    def _link(self, patient, contact):
+        """Count one appearance of contact in patient's record."""
+        count = self.in_degree.get(contact, 0)
+        self.in_degree[contact] = count + 1
+        self._in_degrees.move(contact, count or None, count + 1)
+        parents = self.reverse.setdefault(contact, {})
+        parents[patient] = parents.get(patient, 0) + 1
+
+        if contact in self.adjacency:
+            if not count:
+                self._patients_zero.discard(contact)
+        else:
+            self._zombie_contacts[patient] += 1
+            if not count:
+                # first appearance of a new potential zombie
+                self._potential_zombies.add(contact)
+                self._heights[contact] = 0
+
+    def _unlink(self, patient, contact):
+        """Forget one appearance of contact in patient's record."""
+        count = self.in_degree[contact] - 1
+        self._in_degrees.move(contact, count + 1, count or None)
+        parents = self.reverse[contact]
+        parents[patient] -= 1
+        if not parents[patient]:
+            del parents[patient]
+        if count:
+            self.in_degree[contact] = count
+        else:
+            del self.in_degree[contact]
+            del self.reverse[contact]
+
+        if contact in self.adjacency:
+            if not count:
+                self._patients_zero.add(contact)
+        else:
+            self._zombie_contacts[patient] -= 1
+            if not count:
+                # nobody lists this potential zombie any more
+                self._potential_zombies.discard(contact)
+                self._heights.pop(contact, None)
+                self._dirty.discard(contact)
+
+    def _updated(self, patient, old_degree):
+        """Refresh everything derived from patient's record after a
+        change."""
+        self._out_degrees.move(patient, old_degree,
+                               len(self.adjacency[patient]))
+        self._classify(patient)
+        self._invalidate(patient)
+
+    def _classify(self, patient):
+        """Put a sick person in the right zombie type sets."""
+        zombies = self._zombie_contacts[patient]
+        sick = len(self.adjacency[patient]) - zombies
+        for zombie_type, member in ((self._spreader, not sick),
+                                    (self._regular, sick and zombies),
+                                    (self._predator, not zombies)):
+            if member:
+                zombie_type.add(patient)
+            else:
+                zombie_type.discard(patient)
+
+    def _invalidate(self, name):
+        """Drop the cached height of name and of everyone who can reach
+        them. Anyone already invalidated has invalidated ancestors too."""
+        stack = [name]
+        while stack:
+            person = stack.pop()
+            if person in self._dirty:
+                continue
+            self._dirty.add(person)
+            self._heights.pop(person, None)
+            stack.extend(self.reverse.get(person, ()))
+
+    def _settle_heights(self):
+        """Recompute the heights of everyone invalidated since the last
+        query, in depth-first post-order without recursion."""
+        heights = self._heights
+        adjacency = self.adjacency
+
+        try:
+            for root in self._dirty:
+                if root in heights:
+                    continue
+                active = {root}
+                work = [(root, iter(adjacency.get(root, ())))]
+                while work:
+                    person, contacts = work[-1]
+                    for contact in contacts:
+                        if contact not in heights:
+                            if contact in active:
+                                raise ValueError(
+                                    "contact data contains a cycle")
+                            active.add(contact)
+                            work.append((contact,
+                                         iter(adjacency.get(contact, ()))))
+                            break
+                    else:
+                        work.pop()
+                        active.discard(person)
+                        heights[person] = 1 + max(
+                            (heights[contact]
+                             for contact in adjacency.get(person, ())),
+                            default=-1)
+        finally:
+            # a cycle stops the search part way: keep whatever was settled
+            self._dirty = {name for name in self._dirty
+                           if name not in heights}
+
+
+# Run some tests if the module has not been imported
+if __name__ == "__main__":
+    import random
+
+    import contact
+
+    def check(expected, actual, what):
+        """Compare two lists of names regardless of order."""
+        assert sorted(expected) == sorted(actual), \
+            f"{what}: expected {sorted(expected)}, got {sorted(actual)}"
+
+    # Apply random corrections to a DynamicContactGraph and to a plain
+    # dictionary, and after each one compare the maintained results with
+    # the find_* functions recomputed on the dictionary from scratch.
+    # Sick people only list people with a higher number, so the heights
+    # never meet a cycle.
+    rng = random.Random(2024)
+    for trial in range(200):
+        people = [f"p{i}" for i in range(rng.randint(2, 12))]
+        contacts_dic = {}
+        dynamic = DynamicContactGraph()
+        for step in range(40):
+            patient = rng.choice(people[:-1])
+            later = people[people.index(patient) + 1:]
+            operation = rng.random()
+            if operation < 0.4:
+                contacts_list = [rng.choice(later)
+                                 for _ in range(rng.randint(0, 4))]
+                contacts_dic[patient] = contacts_list
+                dynamic.add_record(patient, contacts_list)
+            elif operation < 0.65:
+                contact_name = rng.choice(later)
+                contacts_dic.setdefault(patient, []).append(contact_name)
+                dynamic.add_contact(patient, contact_name)
+            elif operation < 0.85:
+                if not contacts_dic.get(patient):
+                    continue
+                contact_name = rng.choice(contacts_dic[patient])
+                contacts_dic[patient].remove(contact_name)
+                dynamic.remove_contact(patient, contact_name)
+            else:
+                if patient not in contacts_dic:
+                    continue
+                del contacts_dic[patient]
+                dynamic.remove_patient(patient)
+
+            assert dynamic.adjacency == contacts_dic
+            zombies = contact.find_potential_zombies(contacts_dic)
+            check(contact.find_patients_zero(contacts_dic),
+                  dynamic.patients_zero(), "patients zero")
+            check(zombies, dynamic.potential_zombies(), "potential zombies")
+            check(contact.find_most_viral(contacts_dic),
+                  dynamic.most_viral(), "most viral")
+            check(contact.find_most_contacted(contacts_dic),
+                  dynamic.most_contacted(), "most contacted")
+            spreader, regular, predator = contact.classify_zombies(
+                contacts_dic, zombies)
+            check(spreader, dynamic.spreader_zombies(), "spreader zombies")
+            check(regular, dynamic.regular_zombies(), "regular zombies")
+            check(predator, dynamic.predator_zombies(), "predator zombies")
+            assert dynamic.heights() == \
+                contact.find_maximum_distance_from_zombie(
+                    contacts_dic, zombies), "heights"
+
+    print("DynamicContactGraph matches recomputation after",
+          trial + 1, "random sequences of corrections")
+
+    # Feed ContactStatistics random records, where later records often
+    # replace earlier ones as repeated lines of a file do, and compare its
+    # answers with sections 5 to 9 computed on the parsed dictionary.
+    # Queries between records check that stale maxima are found again and
+    # then kept up to date.
+    for trial in range(200):
+        people = [f"p{i}" for i in range(rng.randint(1, 10))]
+        contacts_dic = {}
+        statistics = ContactStatistics()
+        for step in range(30):
+            patient = rng.choice(people)
+            contacts_list = [rng.choice(people)
+                             for _ in range(rng.randint(0, 4))]
+            statistics.add_record(patient, contacts_list,
+                                  contacts_dic.get(patient))
+            contacts_dic[patient] = contacts_list
+
+            if rng.random() < 0.3 or step == 29:
+                patients_zero = contact.find_patients_zero(contacts_dic)
+                zombies = contact.find_potential_zombies(contacts_dic)
+                check(patients_zero, statistics.patients_zero(),
+                      "patients zero")
+                check(zombies, statistics.potential_zombies(),
+                      "potential zombies")
+                check(contact.find_not_zombie_nor_zero(
+                          contacts_dic, patients_zero, zombies),
+                      statistics.not_zombie_nor_zero(),
+                      "neither patient zero nor zombie")
+                check(contact.find_most_viral(contacts_dic),
+                      statistics.most_viral(), "most viral")
+                check(contact.find_most_contacted(contacts_dic),
+                      statistics.most_contacted(), "most contacted")
+
+    print("ContactStatistics matches recomputation after",
+          trial + 1, "random streams of records")
@@ -0,0 +1,574 @@
+#!/usr/bin/env python3
+"""Read contact tracing files as a stream of (patient, contacts) records so
+that large inputs can be indexed without holding their text in memory.
+"""
+
+import bz2
+import gc
+import gzip
+import hashlib
+import lzma
+import mmap
+import os
+import queue
+import re
+import struct
+import sys
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+# Binary graph cache layout (native byte order, sections 8-byte aligned):
+#   header      GRAPH_CACHE_HEADER, see below
+#   name table  every name, utf-8 encoded and joined by newlines
+#   patients    one uint32 name id per sick person, in dictionary order
+#   offsets     num_patients + 1 uint64 positions into targets (CSR rows)
+#   targets     one uint32 name id per contact
+GRAPH_CACHE_SUFFIX = '.cgraph'
+GRAPH_CACHE_MAGIC = b'CGRAPH01'
+# magic, byte order, input size, input mtime (ns), input digest, number of
+# unreadable lines, names, patients, contacts and name table bytes
+GRAPH_CACHE_HEADER = struct.Struct('=8s8sQq32s5Q')
+_BYTE_ORDER = sys.byteorder.encode().ljust(8)
+
+# First bytes of the compressed formats read transparently. A bz2 stream
+# starts with "BZh", its block size from 1 to 9 and the magic number of
+# either a block or the end of the stream, so a plain file whose first name
+# starts with "BZh" is not mistaken for one.
+COMPRESSION_MAGIC = (
+    (re.compile(b'\x1f\x8b'), gzip),
+    (re.compile(b'BZh[1-9](?:1AY&SY|\x17rE8P\x90)'), bz2),
+    (re.compile(b'\xfd7zXZ\x00'), lzma),
+)
+COMPRESSION_MAGIC_SIZE = 10
+
+# Bytes of a file tokenized at once.
+PARSE_BLOCK_SIZE = 1 << 22
+
+
+def detect_compression(file_name):
+    """Return the module that decompresses a file, judged by its first
+    bytes, or None for plain text.
+
+    Args:
+        file_name (str): name of the file
+
+    Returns:
+        module: gzip, bz2 or lzma, or None.
+    """
+    with open(file_name, 'rb') as file:
+        head = file.read(COMPRESSION_MAGIC_SIZE)
+    for magic, codec in COMPRESSION_MAGIC:
+        if magic.match(head):
+            return codec
+    return None
+
+
+def iter_decompressed_blocks(file_name, codec, block_size=1 << 20,
+                             queue_size=8):
+    """Yield the decompressed contents of a file in blocks. The blocks are
+    decompressed in a background thread, which the codecs let run while
+    this thread parses the blocks already delivered.
+
+    Args:
+        file_name (str): name of the compressed file.
+        codec (module): gzip, bz2 or lzma, as returned by detect_compression.
+        block_size (int): number of decompressed bytes per block.
+        queue_size (int): number of blocks decompressed ahead of the reader.
+
+    Yields:
+        bytes: the next block of the file.
+    """
+    blocks = queue.Queue(queue_size)
+    stop = threading.Event()
+
+    def decompress():
+        try:
+            with codec.open(file_name, 'rb') as file:
+                while not stop.is_set():
+                    block = file.read(block_size)
+                    if not block:
+                        break
+                    blocks.put(block)
+        except Exception as error:      # re-raised in the reading thread
+            blocks.put(error)
+        blocks.put(None)
+
+    worker = threading.Thread(target=decompress, daemon=True)
+    worker.start()
+    try:
+        while (block := blocks.get()) is not None:
+            if isinstance(block, Exception):
+                raise block
+            yield block
+    finally:
+        # a reader that stops early must not leave the worker blocked
+        stop.set()
+        while worker.is_alive():
+            try:
+                blocks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def _whole_line_blocks(blocks):
+    """Regroup a stream of blocks so that each one ends with a whole line."""
+    pending = b''
+    for block in blocks:
+        cut = block.rfind(b'\n') + 1
+        if not cut:
+            pending += block
+            continue
+        yield pending + block[:cut]
+        pending = block[cut:]
+    if pending:
+        yield pending
+
+
+def _mapped_blocks(mapped, start, end, block_size):
+    """Yield the lines of a memory-mapped file that start in [start, end) as
+    blocks of about block_size bytes, each ending with a whole line."""
+    size = len(mapped)
+    if end is None or end > size:
+        end = size
+    position = start
+    while position < end:
+        cut = mapped.find(b'\n', min(position + block_size, end) - 1)
+        cut = size if cut == -1 else cut + 1
+        yield mapped[position:cut]
+        position = cut
+
+
+def _split_lines(block):
+    """Split bytes into lines the way a file opened in text mode would:
+    "\n", "\r\n" and a lone "\r" all end a line."""
+    return block.replace(b'\r\n', b'\n').replace(b'\r', b'\n').split(b'\n')
+
+
+def _parse_lines(lines, on_error, intern):
+    """Turn lines of bytes into (patient, contacts) records one at a time,
+    so a line that is not valid UTF-8 only costs itself."""
+    for line in lines:
+        try:
+            # split the line into patient and contacts
+            patient, *contacts_list = line.decode('utf-8').rstrip().split(',')
+        except ValueError:
+            if on_error is not None:
+                on_error()
+            continue
+
+        if intern is not None:
+            patient = intern(patient, patient)
+            contacts_list = [intern(name, name) for name in contacts_list]
+        yield patient, contacts_list
+
+
+@contextmanager
+def _collection_paused():
+    """Pause the cyclic garbage collector, unless it is already off.
+
+    Records are strings in lists in tuples and never form cycles, but
+    allocating millions of them keeps triggering collections that scan them
+    for nothing.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _parse_block(block, on_error, intern):
+    """Turn a block of whole lines into a list of (patient, contacts)
+    records.
+
+    The block is decoded once and split into lines and names with
+    str.split, so no line is read or decoded on its own, and with the
+    garbage collector paused. As in a file opened in text mode, "\n",
+    "\r\n" and a lone "\r" all end a line. A block that is not valid UTF-8
+    is parsed again line by line to find the lines at fault.
+
+    Args:
+        block (bytes): whole lines of a contact file.
+        on_error (callable): called for every line that cannot be read.
+        intern (callable): setdefault of the table of names seen so far, or
+        None to leave the names alone.
+    """
+    try:
+        text = block.decode('utf-8')
+    except UnicodeDecodeError:
+        lines = _split_lines(block)
+        if not lines[-1]:
+            lines.pop()
+        return list(_parse_lines(lines, on_error, intern))
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    lines = text.split('\n')
+    if not lines[-1]:
+        lines.pop()                 # after the block's last newline
+
+    records = []
+    append = records.append
+    with _collection_paused():
+        if intern is None:
+            for line in lines:
+                patient, *contacts_list = line.rstrip().split(',')
+                append((patient, contacts_list))
+        else:
+            for line in lines:
+                names = line.rstrip().split(',')
+                patient, *contacts_list = map(intern, names, names)
+                append((patient, contacts_list))
+    return records
+
+
+def iter_record_blocks(file_name, on_error=None, start=0, end=None,
+                       intern_names=True, block_size=PARSE_BLOCK_SIZE):
+    """Yield the records of a contact file a block of lines at a time.
+
+    Plain files are memory-mapped and cut into blocks at line ends. Files
+    compressed with gzip, bz2 or xz are recognised by their first bytes and
+    decompressed in a background thread as they are read. Each block is
+    tokenized as a whole by _parse_block. Names are interned as they are
+    read: every appearance of a name yields the same string object, so an
+    index built from the records costs one string per person rather than
+    one per appearance.
+
+    Args:
+        file_name (str): name of the file
+        on_error (callable): called with no arguments for every line that
+        cannot be read. Such lines are skipped.
+        start (int): byte offset of the first line to read.
+        end (int): lines starting at or after this byte offset are not read.
+        Defaults to the end of the file. A compressed file cannot be read in
+        ranges, so for one start must be 0 and end is ignored.
+        intern_names (bool): intern the names. The table of interned names
+        grows with the number of people, so readers that must stay within
+        a memory budget turn it off.
+        block_size (int): about how many bytes of the file each block holds.
+
+    Yields:
+        list: (patient, contacts) records in file order. When a patient
+        appears on several lines each line is yielded, so a consumer
+        building a dictionary keeps the last one.
+
+    Raises:
+        ValueError: if start is not 0 for a compressed file.
+    """
+    names = {}
+    intern = names.setdefault if intern_names else None
+
+    codec = detect_compression(file_name)
+    if codec is not None:
+        if start:
+            raise ValueError("a compressed file can only be read whole")
+        for block in _whole_line_blocks(
+                iter_decompressed_blocks(file_name, codec)):
+            yield _parse_block(block, on_error, intern)
+        return
+
+    with open(file_name, 'rb') as file:
+        try:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:          # an empty file cannot be mapped
+            return
+
+        with mapped:
+            if hasattr(mapped, 'madvise'):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            for block in _mapped_blocks(mapped, start, end, block_size):
+                yield _parse_block(block, on_error, intern)
+
+
+def iter_contact_records(file_name, on_error=None, start=0, end=None,
+                         intern_names=True):
+    """Yield one (patient, contacts) record per line of a contact file.
+
+    The records are read a block at a time by iter_record_blocks, so only
+    one block of the file is held as text.
+
+    Args:
+        file_name (str): name of the file
+        on_error (callable): called with no arguments for every line that
+        cannot be read. Such lines are skipped.
+        start (int): byte offset of the first line to read.
+        end (int): lines starting at or after this byte offset are not read.
+        Defaults to the end of the file.
+        intern_names (bool): intern the names, as for iter_record_blocks.
+
+    Yields:
+        tuple: the sick person's name and the list of their contacts. When a
+        patient appears on several lines each line is yielded, so a consumer
+        building a dictionary keeps the last one.
+
+    Raises:
+        ValueError: if start is not 0 for a compressed file.
+    """
+    for records in iter_record_blocks(file_name, on_error, start, end,
+                                      intern_names):
+        yield from records
+
+
+def split_byte_ranges(file_name, num_ranges):
+    """Split a file into byte ranges that each start at the beginning of a
+    line.
+
+    Args:
+        file_name (str): name of the file
+        num_ranges (int): number of roughly equal ranges wanted.
+
+    Returns:
+        list: (start, end) byte offsets covering the whole file in order.
+        Fewer ranges are returned when the file has too few lines, and a
+        compressed file is always one range.
+    """
+    size = os.path.getsize(file_name)
+    if size == 0:
+        return []
+    if detect_compression(file_name) is not None:
+        return [(0, size)]          # compressed files cannot be split
+
+    boundaries = [0]
+    with open(file_name, 'rb') as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        for i in range(1, num_ranges):
+            # move each cut forward to just after the next newline
+            newline = mapped.find(b'\n', max(size * i // num_ranges,
+                                             boundaries[-1]))
+            if newline == -1 or newline + 1 >= size:
+                break
+            if newline + 1 > boundaries[-1]:
+                boundaries.append(newline + 1)
+    boundaries.append(size)
+
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def _parse_byte_range(file_name, start, end):
+    """Parse the lines of one byte range in a worker process.
+
+    Returns:
+        tuple: the contact dictionary for the range and the number of lines
+        that could not be read.
+    """
+    num_errors = 0
+
+    def count_error():
+        nonlocal num_errors
+        num_errors += 1
+
+    contact_dic = {}
+    for records in iter_record_blocks(file_name, count_error, start, end):
+        contact_dic.update(records)
+    return contact_dic, num_errors
+
+
+def parse_file_parallel(file_name, workers=None, on_error=None):
+    """Parse a contact file in a pool of processes, one byte range each.
+
+    The partial dictionaries are merged in file order, so the result equals
+    the sequential one: a patient listed on several lines keeps the contacts
+    from the last line and the position of the first.
+
+    Args:
+        file_name (str): name of the file
+        workers (int): number of processes. Defaults to one per CPU.
+        on_error (callable): called with no arguments for every line that
+        cannot be read, once all ranges have been parsed.
+
+    Returns:
+        dict: each entry is a sick person's name and their list of contacts.
+    """
+    workers = workers or os.cpu_count() or 1
+    ranges = split_byte_ranges(file_name, workers)
+    contact_dic = {}
+    num_errors = 0
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges) or 1)) \
+            as executor:
+        futures = [executor.submit(_parse_byte_range, file_name, start, end)
+                   for start, end in ranges]
+        for future in futures:
+            partial_dic, partial_errors = future.result()
+            contact_dic.update(partial_dic)
+            num_errors += partial_errors
+
+    if on_error is not None:
+        for _ in range(num_errors):
+            on_error()
+
+    return contact_dic
+
+
+def file_digest(file_name):
+    """Return the BLAKE2b digest of a file's contents.
+
+    Args:
+        file_name (str): name of the file
+
+    Returns:
+        bytes: 32 byte digest.
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    with open(file_name, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.digest()
+
+
+def _pad(length):
+    """Return the number of bytes needed to align length to 8 bytes."""
+    return -length % 8
+
+
+def write_graph_cache(file_name, contact_dic, num_errors=0, cache_name=None):
+    """Save a parsed contact dictionary next to its input in a compact binary
+    form that read_graph_cache can load without parsing.
+
+    The cache is keyed by the input's size, modification time and digest.
+    Failing to write it is not an error: the cache is simply not created.
+
+    Args:
+        file_name (str): name of the file contact_dic was parsed from.
+        contact_dic (dic): each entry is a sick person's name and their list
+        of contacts.
+        num_errors (int): number of lines that could not be read, so loading
+        the cache can report them again.
+        cache_name (str): where to write the cache. Defaults to file_name
+        followed by GRAPH_CACHE_SUFFIX.
+    """
+    cache_name = cache_name or file_name + GRAPH_CACHE_SUFFIX
+    stat = os.stat(file_name)
+
+    # intern every name to a small integer id
+    name_ids = {}
+    for patient in contact_dic:
+        name_ids.setdefault(patient, len(name_ids))
+    patients = array('I', name_ids.values())
+    offsets = array('Q', [0])
+    targets = array('I')
+    for contacts_list in contact_dic.values():
+        targets.extend([name_ids.setdefault(name, len(name_ids))
+                        for name in contacts_list])
+        offsets.append(len(targets))
+    name_table = '\n'.join(name_ids).encode('utf-8')
+
+    header = GRAPH_CACHE_HEADER.pack(
+        GRAPH_CACHE_MAGIC, _BYTE_ORDER, stat.st_size, stat.st_mtime_ns,
+        file_digest(file_name), num_errors, len(name_ids), len(patients),
+        len(targets), len(name_table))
+
+    temp_name = f"{cache_name}.{os.getpid()}.tmp"
+    try:
+        with open(temp_name, 'wb') as cache:
+            for section in (header, name_table, patients, offsets):
+                cache.write(section)
+                cache.write(bytes(_pad(len(memoryview(section).cast('B')))))
+            cache.write(targets)
+        os.replace(temp_name, cache_name)
+    except OSError:
+        try:
+            os.remove(temp_name)
+        except OSError:
+            pass
+
+
+def read_graph_cache(file_name, cache_name=None):
+    """Load a contact dictionary saved by write_graph_cache.
+
+    The cache is used when it was written for the input's current size and
+    modification time. When only the modification time differs, the input's
+    digest decides, and a matching cache is refreshed with the new time.
+
+    Args:
+        file_name (str): name of the file the cache was made from.
+        cache_name (str): where the cache is. Defaults to file_name followed
+        by GRAPH_CACHE_SUFFIX.
+
+    Returns:
+        tuple: the contact dictionary and the number of unreadable lines, or
+        None if there is no up to date cache.
+    """
+    cache_name = cache_name or file_name + GRAPH_CACHE_SUFFIX
+    try:
+        stat = os.stat(file_name)
+        cache = open(cache_name, 'rb')
+    except OSError:
+        return None
+
+    with cache, mmap.mmap(cache.fileno(), 0, access=mmap.ACCESS_READ) \
+            as mapped, memoryview(mapped) as view:
+        if len(mapped) < GRAPH_CACHE_HEADER.size:
+            return None
+        (magic, byte_order, size, mtime_ns, digest, num_errors, num_names,
+         num_patients, num_edges, table_size) = \
+            GRAPH_CACHE_HEADER.unpack_from(mapped)
+
+        if (magic != GRAPH_CACHE_MAGIC or byte_order != _BYTE_ORDER
+                or size != stat.st_size):
+            return None
+        if mtime_ns != stat.st_mtime_ns:
+            if digest != file_digest(file_name):
+                return None
+            _refresh_graph_cache(cache_name, stat.st_mtime_ns)
+
+        position = GRAPH_CACHE_HEADER.size
+        position += _pad(position)
+        name_table = mapped[position:position + table_size]
+        position += table_size + _pad(table_size)
+        patient_ids = view[position:position + 4 * num_patients].cast('I')
+        position += 4 * num_patients + _pad(4 * num_patients)
+        offsets = view[position:position + 8 * (num_patients + 1)].cast('Q')
+        position += 8 * (num_patients + 1)
+        targets = view[position:position + 4 * num_edges].cast('I')
+
+        names = name_table.decode('utf-8').split('\n') if num_names else []
+        name_of = names.__getitem__
+        contact_dic = {}
+        for i, patient_id in enumerate(patient_ids):
+            contact_dic[names[patient_id]] = \
+                list(map(name_of, targets[offsets[i]:offsets[i + 1]]))
+
+        # release the exported buffers before the mapping is closed
+        for buffer in (patient_ids, offsets, targets):
+            buffer.release()
+
+    return contact_dic, num_errors
+
+
+def _refresh_graph_cache(cache_name, mtime_ns):
+    """Record a new input modification time in an existing cache."""
+    position = struct.calcsize('=8s8sQ')     # magic, byte order and size
+    try:
+        with open(cache_name, 'r+b') as cache:
+            cache.seek(position)
+            cache.write(struct.pack('=q', mtime_ns))
+    except OSError:
+        pass
+
+
+# Run some tests if the module has not been imported
+if __name__ == "__main__":
+    import tempfile
+
+    records = b"BZhou,Alice,Bob\nAlice,Carol\n"
+    expected = {"BZhou": ["Alice", "Bob"], "Alice": ["Carol"]}
+
+    with tempfile.TemporaryDirectory() as directory:
+        # a plain file whose first name starts like a bz2 header is text
+        for name, data, codec, contact_dic in (
+                ("plain.txt", records, None, expected),
+                ("plain.txt.gz", gzip.compress(records), gzip, expected),
+                ("plain.txt.bz2", bz2.compress(records), bz2, expected),
+                ("plain.txt.xz", lzma.compress(records), lzma, expected),
+                ("empty.txt.bz2", bz2.compress(b""), bz2, {})):
+            file_name = os.path.join(directory, name)
+            with open(file_name, 'wb') as file:
+                file.write(data)
+            assert detect_compression(file_name) is codec, name
+            assert dict(iter_contact_records(file_name)) == contact_dic, name
+            print(name, "is read as", codec and codec.__name__, "and gives",
+                  contact_dic)
@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""Analyse contact tracing data with NumPy. Names are interned to int32 ids
+and the contact lists are stored as compressed sparse rows (CSR), so each
+section is a handful of vectorised operations instead of a loop over Python
+strings.
+
+This module needs NumPy, which contact.py only imports when the numpy
+backend is selected. The functions mirror the ones in contact.py and return
+the same lists of names, so the pretty printers can be used unchanged.
+"""
+
+import numpy as np
+
+from contact_graph import condensation_heights
+
+# Below this many people a round of vectorised height settling costs more
+# in NumPy call overhead than it saves.
+_NARROW_LEVEL = 256
+
+
+class NumpyContactGraph:
+    """Contact tracing data interned to integer ids.
+
+    Ids 0 to num_patients - 1 are the sick people in dictionary order. The
+    remaining ids are the people who only appear in contact lists.
+
+    Attributes:
+        adjacency (dic): the dictionary the graph was built from.
+        names (list): the name of each id.
+        num_patients (int): number of sick people.
+        offsets (ndarray): int64, contacts of patient i are
+        targets[offsets[i]:offsets[i + 1]].
+        targets (ndarray): int32 id of every contact.
+        out_degree (ndarray): int64 length of each person's contact list
+        (zero for people who are not sick).
+        in_degree (ndarray): int64 number of appearances of each person in
+        the contact lists.
+    """
+
+    def __init__(self, contacts_dic):
+        """Intern the names and build the CSR arrays.
+
+        Args:
+            contacts_dic (dic): each entry is a sick person's name and their
+            list of contacts.
+        """
+        name_ids = dict(zip(contacts_dic, range(len(contacts_dic))))
+        intern = name_ids.setdefault
+        num_patients = len(name_ids)
+
+        lengths = np.fromiter(map(len, contacts_dic.values()), np.int64,
+                              count=num_patients)
+        offsets = np.zeros(num_patients + 1, np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        targets = np.fromiter(
+            (intern(name, len(name_ids))
+             for contacts_list in contacts_dic.values()
+             for name in contacts_list),
+            np.int32, count=int(offsets[-1]))
+
+        self.adjacency = contacts_dic
+        self.names = list(name_ids)
+        self.num_patients = num_patients
+        self.offsets = offsets
+        self.targets = targets
+        self.out_degree = np.zeros(len(self.names), np.int64)
+        self.out_degree[:num_patients] = lengths
+        self.in_degree = np.bincount(targets, minlength=len(self.names))
+        self._name_ids = None
+
+    def __len__(self):
+        return self.num_patients
+
+    def names_of(self, ids):
+        """Return the names for an array of ids as a list."""
+        names = self.names
+        return [names[i] for i in ids.tolist()]
+
+    @property
+    def name_ids(self):
+        """The id of each name, built the first time it is needed."""
+        if self._name_ids is None:
+            self._name_ids = dict(zip(self.names, range(len(self.names))))
+        return self._name_ids
+
+    def ids_of(self, names):
+        """Return the ids of those of the names that are in the graph, as
+        an array."""
+        name_ids = self.name_ids
+        return np.fromiter((name_ids[name] for name in names
+                            if name in name_ids), np.int64)
+
+    def sources(self):
+        """Return the id of the sick person that listed each contact."""
+        return np.repeat(np.arange(self.num_patients, dtype=np.int32),
+                         self.out_degree[:self.num_patients])
+
+    def forward_csr(self):
+        """Return offsets and targets with a row for every id, so people who
+        are not sick have an empty row."""
+        offsets = np.empty(len(self.names) + 1, np.int64)
+        offsets[:self.num_patients + 1] = self.offsets
+        offsets[self.num_patients + 1:] = self.offsets[-1]
+        return offsets, self.targets
+
+    def reverse_csr(self):
+        """Return offsets and ids of who listed each person: the sick people
+        who listed id i are listed_by[offsets[i]:offsets[i + 1]]."""
+        order = np.argsort(self.targets, kind='stable')
+        listed_by = self.sources()[order]
+        reverse_offsets = np.zeros(len(self.names) + 1, np.int64)
+        np.cumsum(self.in_degree, out=reverse_offsets[1:])
+        return reverse_offsets, listed_by
+
+
+def _gather_rows(offsets, values, ids):
+    """Concatenate the CSR rows of several ids.
+
+    Returns:
+        tuple: the values of the rows, one after another, and the length of
+        each row.
+    """
+    starts = offsets[ids]
+    counts = offsets[ids + 1] - starts
+    ends = np.cumsum(counts)
+    total = int(ends[-1]) if ends.size else 0
+    positions = np.arange(total) + np.repeat(starts - ends + counts, counts)
+    return values[positions], counts
+
+
+# Function for section 5
+def find_patients_zero(graph):
+    """Return list of people who do not appear in any sick person's contact
+    list.
+
+    Args:
+        graph (NumpyContactGraph): interned contact tracing data.
+
+    Returns:
+        list: names of people who do not appear in any sick person's contact
+        list.
+    """
+    patients_in_degree = graph.in_degree[:graph.num_patients]
+    return graph.names_of(np.flatnonzero(patients_in_degree == 0))
+
+
+# Function for section 6
+def find_potential_zombies(graph):
+    """Return list of people who appear in the contact lists but do not have
+    their own contacts entry.
+
+    Args:
+        graph (NumpyContactGraph): interned contact tracing data.
+
+    Returns:
+        list: names of people who are not listed as sick.
+    """
+    # every id after the patients was first seen in a contact list
+    return graph.names[graph.num_patients:]
+
+
+# Function for section 7
+def find_not_zombie_nor_zero(graph, patients_zero_list=None,
+                             zombie_list=None):
+    """Return names of those people who are neither a zombie nor a patient
+    zero.
+
+    Args:
+        graph (NumpyContactGraph): interned contact tracing data.
+        patients_zero_list (list): sick people identified as patient zero(es).
+        Defaults to the sick people nobody listed.
+        zombie_list (list): contacts who are not a sick person (don't have
+        their own contact list). Defaults to the graph's zombies, none of
+        whom is a sick person.
+
+    Returns:
+        list: people who are neither a zombie nor a patient zero.
+    """
+    if patients_zero_list is None and zombie_list is None:
+        # the sick people who appear in someone's contact list
+        patients_in_degree = graph.in_degree[:graph.num_patients]
+        return graph.names_of(np.flatnonzero(patients_in_degree > 0))
+
+    if patients_zero_list is None:
+        patients_zero_list = find_patients_zero(graph)
+    excluded = set(patients_zero_list).union(zombie_list or ())
+    return [name for name in graph.names[:graph.num_patients]
+            if name not in excluded]
+
+
+# Function for section 8
+def find_most_viral(graph):
+    """Return the sick people with the largest contact lists.
+
+    Args:
+        graph (NumpyContactGraph): interned contact tracing data.
+
+    Returns:
+        list: contains the names of sick people who have the largest contact
+        lists
+    """
+    if not graph.num_patients:
+        return []
+    patients_out_degree = graph.out_degree[:graph.num_patients]
+    max_len = patients_out_degree.max()
+    return graph.names_of(np.flatnonzero(patients_out_degree == max_len))
+
+
+# Function for section 9
+def find_most_contacted(graph):
+    """Return the contact or contacts who appear in the most sick persons'
+    contact list.
+
+    Args:
+        graph (NumpyContactGraph): interned contact tracing data.
+
+    Returns:
+        list: contains the names of contacts who appear in the most sick
+        persons' contact list.
+    """
+    if not graph.targets.size:
+        return []
+    max_count = graph.in_degree.max()
+    return graph.names_of(np.flatnonzero(graph.in_degree == max_count))
+
+
+# Function for section 10
+def _settle_one_at_a_time(heights, unsettled, offsets, listed_by, ready):
+    """Finish settling heights with a plain topological pass over Python
+    lists, starting from the ids in ready.
+
+    Returns:
+        int: number of people settled, ready included.
+    """
+    height_of = heights.tolist()
+    unsettled = unsettled.tolist()
+    offsets = offsets.tolist()
+    listed_by = listed_by.tolist()
+    queue = ready.tolist()
+
+    for person in queue:            # grows as people become ready
+        height = height_of[person] + 1
+        for parent in listed_by[offsets[person]:offsets[person + 1]]:
+            if height_of[parent] < height:
+                height_of[parent] = height
+            unsettled[parent] -= 1
+            if not unsettled[parent]:
+                queue.append(parent)
+
+    heights[:] = height_of
+    return len(queue)
+
+
+def find_maximum_distance_from_zombie(graph, zombie_list=None):
+    """Return the maximum distance from a zombie for everyone in the dataset.
+
+    Heights are settled one level at a time in topological order: each round
+    settles every person whose contacts are all settled. If the contacts
+    contain a cycle the rounds stop short, and the heights are taken from
+    condensation_heights instead, as in contact.py.
+
+    Args:
+        graph (NumpyContactGraph): interned contact tracing data.
+        zombie_list (list): all zombies. Those who are not in the graph are
+        given height 0, as in contact.py.
+
+    Returns:
+        dic: contains heights (maximum distance) of person from a zombie,
+        ordered from the greatest height down and then by name.
+    """
+    num_people = len(graph.names)
+    reverse_offsets, listed_by = graph.reverse_csr()
+
+    heights = np.zeros(num_people, np.int64)
+    unsettled = graph.out_degree.copy()
+    ready = np.flatnonzero(unsettled == 0)
+    num_settled = 0
+
+    while ready.size:
+        if ready.size < _NARROW_LEVEL:
+            # each round has a fixed cost in NumPy calls, which long thin
+            # chains would pay once per person: finish one at a time
+            num_settled += _settle_one_at_a_time(
+                heights, unsettled, reverse_offsets, listed_by, ready)
+            break
+        num_settled += ready.size
+
+        # gather everyone who listed a person that has just been settled
+        parents, counts = _gather_rows(reverse_offsets, listed_by, ready)
+        if not parents.size:
+            break
+
+        np.maximum.at(heights, parents, np.repeat(heights[ready] + 1, counts))
+        # only the people touched are counted down, so a round costs what
+        # it settles rather than the size of the graph
+        touched, times = np.unique(parents, return_counts=True)
+        unsettled[touched] -= times
+        ready = touched[unsettled[touched] == 0]
+
+    if num_settled < num_people:
+        heights_dic = condensation_heights(graph.adjacency)
+    else:
+        heights_dic = dict(zip(graph.names, heights.tolist()))
+    for name in zombie_list or ():
+        heights_dic.setdefault(name, 0)
+    return dict(sorted(heights_dic.items(),
+                       key=lambda item: (-item[1], item[0])))
+
+
+def _breadth_first_distances(graph, offsets, neighbours, sources):
+    """Return the fewest steps from any source id to every id, or -1 where
+    none is reachable. Each round expands the whole frontier at once."""
+    distances = np.full(len(graph.names), -1, np.int64)
+    distances[sources] = 0
+    frontier = sources
+    distance = 0
+
+    while frontier.size:
+        distance += 1
+        reached = _gather_rows(offsets, neighbours, frontier)[0]
+        frontier = np.unique(reached[distances[reached] < 0])
+        distances[frontier] = distance
+
+    return distances
+
+
+def _distances_dic(graph, distances, missing=()):
+    """Turn an array of distances into a dictionary ordered by distance and
+    then name, leaving out the unreachable ids. Missing sources, named by
+    the caller but not in the graph, are at distance 0."""
+    reached = np.flatnonzero(distances >= 0)
+    pairs = sorted([*zip(distances[reached].tolist(),
+                         graph.names_of(reached)),
+                    *((0, name) for name in set(missing))])
+    return {name: distance for distance, name in pairs}
+
+
+def _source_ids(graph, names):
+    """Return the ids of the sources named by the caller, and the names
+    that are not in the graph."""
+    name_ids = graph.name_ids
+    return (graph.ids_of(names),
+            [name for name in names if name not in name_ids])
+
+
+# Functions for section 15
+def find_distance_from_patients_zero(graph, patients_zero_list=None):
+    """Return the fewest contact tracing steps from any patient zero to each
+    person, found with one breadth first search from all of them.
+
+    Args:
+        graph (NumpyContactGraph): interned contact tracing data.
+        patients_zero_list (list): the people at distance 0. Defaults to
+        the sick people nobody listed.
+
+    Returns:
+        dic: contains the distance of each person from the nearest patient
+        zero, ordered from the smallest distance up and then by name. People
+        no patient zero leads to are left out.
+    """
+    offsets, targets = graph.forward_csr()
+    if patients_zero_list is None:
+        patients_zero = np.flatnonzero(
+            graph.in_degree[:graph.num_patients] == 0)
+        missing = ()
+    else:
+        patients_zero, missing = _source_ids(graph, patients_zero_list)
+    return _distances_dic(graph, _breadth_first_distances(
+        graph, offsets, targets, patients_zero), missing)
+
+
+def find_distance_to_zombie(graph, zombie_list=None):
+    """Return the fewest contact tracing steps from each person to the
+    nearest potential zombie, found with one breadth first search up the
+    contact lists from all of them.
+
+    Args:
+        graph (NumpyContactGraph): interned contact tracing data.
+        zombie_list (list): the people at distance 0. Defaults to everyone
+        who is not sick.
+
+    Returns:
+        dic: contains the distance of each person to the nearest zombie,
+        ordered from the smallest distance up and then by name. People who
+        cannot reach a zombie are left out.
+    """
+    reverse_offsets, listed_by = graph.reverse_csr()
+    if zombie_list is None:
+        zombies = np.arange(graph.num_patients, len(graph.names))
+        missing = ()
+    else:
+        zombies, missing = _source_ids(graph, zombie_list)
+    return _distances_dic(graph, _breadth_first_distances(
+        graph, reverse_offsets, listed_by, zombies), missing)
+
+
+def find_exposure_distances(graph, patients_zero_list=None,
+                            zombie_list=None):
+    """Return both find_distance_from_patients_zero and
+    find_distance_to_zombie.
+
+    Returns:
+        tuple: the distances from the patients zero and to the zombies.
+    """
+    return (find_distance_from_patients_zero(graph, patients_zero_list),
+            find_distance_to_zombie(graph, zombie_list))
+
+
+def classify_zombies(graph, zombie_list=None):
+    """Split the sick people into spreader, regular and predator zombies by
+    counting, for each of them, the contacts who are themselves sick.
+
+    Args:
+        graph (NumpyContactGraph): interned contact tracing data.
+        zombie_list (list): all zombies. Defaults to everyone who is not
+        sick. As in contact.py, contacts who are neither sick nor in
+        zombie_list keep a sick person out of the spreader and predator
+        lists.
+
+    Returns:
+        tuple: lists of the names of spreader, regular and predator zombies.
+        A sick person with no contacts is both a spreader and a predator.
+    """
+    num_patients = graph.num_patients
+    out_degree = graph.out_degree[:num_patients]
+    sources = graph.sources()
+    sick_contacts = np.bincount(sources[graph.targets < num_patients],
+                                minlength=num_patients)
+    if zombie_list is None:
+        zombie_contacts = out_degree - sick_contacts
+        other_contacts = 0
+    else:
+        # the sick are never counted as zombies, as in contact.py
+        is_zombie = np.zeros(len(graph.names), bool)
+        is_zombie[graph.ids_of(zombie_list)] = True
+        is_zombie[:num_patients] = False
+        zombie_contacts = np.bincount(sources[is_zombie[graph.targets]],
+                                      minlength=num_patients)
+        other_contacts = out_degree - sick_contacts - zombie_contacts
+
+    is_regular = (sick_contacts > 0) & (zombie_contacts > 0)
+    one_kind = ~is_regular & (other_contacts == 0)
+    spreader = graph.names_of(np.flatnonzero(one_kind & (sick_contacts == 0)))
+    regular = graph.names_of(np.flatnonzero(is_regular))
+    predator = graph.names_of(
+        np.flatnonzero(one_kind & (zombie_contacts == 0)))
+    return spreader, regular, predator
+
+
+def find_spreader_zombies(graph, zombie_list=None):
+    """Return list of sick people who only contacted with potential zombies.
+
+    Args:
+        graph (NumpyContactGraph): interned contact tracing data.
+        zombie_list (list): all zombies, as for classify_zombies.
+
+    Returns:
+        list: contains the names of sick people who only contacted with
+        potential zombies.
+    """
+    return classify_zombies(graph, zombie_list)[0]
+
+
+def find_regular_zombies(graph, zombie_list=None):
+    """Return list of sick people that contacted with both potential zombies
+    and people who are already sick.
+
+    Args:
+        graph (NumpyContactGraph): interned contact tracing data.
+        zombie_list (list): all zombies, as for classify_zombies.
+
+    Returns:
+        list: contains the names of sick people who contacted with both
+        potential zombies and other sick people.
+    """
+    return classify_zombies(graph, zombie_list)[1]
+
+
+def find_predator_zombies(graph, zombie_list=None):
+    """Return list of sick people that only has contact with people who are
+    sick.
+
+    Args:
+        graph (NumpyContactGraph): interned contact tracing data.
+        zombie_list (list): all zombies, as for classify_zombies.
+
+    Returns:
+        list: contains the names of sick people who only contacted with
+        people who are already sick.
+    """
+    return classify_zombies(graph, zombie_list)[2]
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""Analyse a contact file as a partitioned map-reduce job, so that no
+process ever holds more than one shard of the data.
+
+Every name belongs to one of num_partitions shards, chosen by the CRC-32 of
+the name. The job runs in phases. Each phase is a function that only reads
+and writes files in a shared work directory, so any process, on any machine
+that sees the directory, can run it once the previous phase is done:
+
+map_records
+    parse one byte range of the file and send each record to the shard of
+    its patient.
+group_records
+    keep the last record of each of the shard's patients, save their
+    out-degrees and send every (contact, patient) pair to the shard of the
+    contact.
+count_contacts
+    count how often each of the shard's names is listed, write the shard's
+    partial sections 5, 6, 7 and 9, and tell each patient's shard whether
+    they listed a sick person, a zombie or both.
+classify_patients
+    combine those flags into the shard's partial sections 8 and 11 to 13.
+reduce_partials
+    merge the partials of every shard.
+
+analyse_partitioned runs the phases locally in a pool of processes.
+"""
+
+import os
+import pickle
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from contact_io import iter_contact_records, split_byte_ranges
+
+PARTITIONED_SECTIONS = (5, 6, 7, 8, 9, 11, 12, 13)
+
+_BLOCK = 4096           # items pickled together in a shard file
+
+# Flags sent to a patient's shard about the people they listed.
+_LISTED_SICK = 1
+_LISTED_ZOMBIE = 2
+
+
+def partition_of(name, num_partitions):
+    """Return the shard a name belongs to."""
+    return zlib.crc32(name.encode('utf-8')) % num_partitions
+
+
+def _path(work_dir, kind, *numbers):
+    return os.path.join(work_dir, "-".join(map(str, (kind, *numbers))))
+
+
+def _dump(path, value):
+    with open(path, 'wb') as file:
+        pickle.dump(value, file, pickle.HIGHEST_PROTOCOL)
+
+
+def _load(path):
+    with open(path, 'rb') as file:
+        return pickle.load(file)
+
+
+def _read_items(path):
+    """Yield the items of a file written by _ShardWriter."""
+    with open(path, 'rb') as file:
+        while True:
+            try:
+                block = pickle.load(file)
+            except EOFError:
+                return
+            yield from block
+
+
+class _ShardWriter:
+    """Send items to one file per shard, pickled in blocks."""
+
+    def __init__(self, work_dir, kind, source, num_partitions):
+        self.files = [open(_path(work_dir, kind, source, shard), 'wb')
+                      for shard in range(num_partitions)]
+        self.buffers = [[] for _ in range(num_partitions)]
+
+    def write(self, shard, item):
+        buffer = self.buffers[shard]
+        buffer.append(item)
+        if len(buffer) >= _BLOCK:
+            pickle.dump(buffer, self.files[shard], pickle.HIGHEST_PROTOCOL)
+            buffer.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        for file, buffer in zip(self.files, self.buffers):
+            if buffer:
+                pickle.dump(buffer, file, pickle.HIGHEST_PROTOCOL)
+            file.close()
+        return False
+
+
+def map_records(file_name, work_dir, num_partitions, part, start, end):
+    """Parse one byte range of a contact file and send each record to the
+    shard of its patient.
+
+    Args:
+        file_name (str): name of the contact file.
+        work_dir (str): the shared work directory.
+        num_partitions (int): number of shards.
+        part (int): number of the byte range, counting from the start of
+        the file.
+        start (int): byte offset of the range.
+        end (int): byte offset just after the range.
+
+    Returns:
+        int: number of lines in the range that could not be read.
+    """
+    num_errors = 0
+
+    def count_error():
+        nonlocal num_errors
+        num_errors += 1
+
+    with _ShardWriter(work_dir, "records", part, num_partitions) as writer:
+        for patient, contacts_list in iter_contact_records(
+                file_name, count_error, start, end):
+            writer.write(partition_of(patient, num_partitions),
+                         (patient, contacts_list))
+    return num_errors
+
+
+def group_records(work_dir, num_partitions, shard, num_parts):
+    """Keep the last record of each of a shard's patients and send each of
+    their contacts to the contact's shard.
+
+    Args:
+        work_dir (str): the shared work directory.
+        num_partitions (int): number of shards.
+        shard (int): the shard to group.
+        num_parts (int): number of byte ranges map_records was run on.
+    """
+    contacts_dic = {}
+    for part in range(num_parts):
+        # ranges are read in file order, so the last record wins
+        for patient, contacts_list in _read_items(
+                _path(work_dir, "records", part, shard)):
+            contacts_dic[patient] = contacts_list
+
+    _dump(_path(work_dir, "patients", shard),
+          {patient: len(contacts_list)
+           for patient, contacts_list in contacts_dic.items()})
+
+    with _ShardWriter(work_dir, "listed", shard, num_partitions) as writer:
+        for patient, contacts_list in contacts_dic.items():
+            for name in contacts_list:
+                writer.write(partition_of(name, num_partitions),
+                             (name, patient))
+
+
+def count_contacts(work_dir, num_partitions, shard):
+    """Count how often each of a shard's names is listed, write the shard's
+    partial sections 5, 6, 7 and 9, and send each patient's shard flags
+    about the people they listed.
+
+    Args:
+        work_dir (str): the shared work directory.
+        num_partitions (int): number of shards.
+        shard (int): the shard to count.
+    """
+    out_degree = _load(_path(work_dir, "patients", shard))
+    in_degree = {}
+    flags = {}
+
+    for source in range(num_partitions):
+        for name, patient in _read_items(
+                _path(work_dir, "listed", source, shard)):
+            in_degree[name] = in_degree.get(name, 0) + 1
+            flags[patient] = flags.get(patient, 0) | (
+                _LISTED_SICK if name in out_degree else _LISTED_ZOMBIE)
+
+    with _ShardWriter(work_dir, "flags", shard, num_partitions) as writer:
+        for patient, flag in flags.items():
+            writer.write(partition_of(patient, num_partitions),
+                         (patient, flag))
+
+    max_in_degree = max(in_degree.values(), default=0)
+    _dump(_path(work_dir, "counted", shard), {
+        5: [name for name in out_degree if name not in in_degree],
+        6: [name for name in in_degree if name not in out_degree],
+        7: [name for name in out_degree if name in in_degree],
+        9: [name for name, count in in_degree.items()
+            if count == max_in_degree],
+        "max_in_degree": max_in_degree,
+    })
+
+
+def classify_patients(work_dir, num_partitions, shard):
+    """Write a shard's partial sections 8 and 11 to 13 from its patients'
+    out-degrees and the flags about the people they listed.
+
+    Args:
+        work_dir (str): the shared work directory.
+        num_partitions (int): number of shards.
+        shard (int): the shard to classify.
+    """
+    out_degree = _load(_path(work_dir, "patients", shard))
+    flags = dict.fromkeys(out_degree, 0)
+    for source in range(num_partitions):
+        for patient, flag in _read_items(
+                _path(work_dir, "flags", source, shard)):
+            flags[patient] |= flag
+
+    max_out_degree = max(out_degree.values(), default=-1)
+    _dump(_path(work_dir, "classified", shard), {
+        8: [name for name, count in out_degree.items()
+            if count == max_out_degree],
+        "max_out_degree": max_out_degree,
+        11: [name for name, flag in flags.items()
+             if not flag & _LISTED_SICK],
+        12: [name for name, flag in flags.items()
+             if flag == _LISTED_SICK | _LISTED_ZOMBIE],
+        13: [name for name, flag in flags.items()
+             if not flag & _LISTED_ZOMBIE],
+    })
+
+
+def reduce_partials(work_dir, num_partitions):
+    """Merge the partial sections of every shard.
+
+    Args:
+        work_dir (str): the shared work directory.
+        num_partitions (int): number of shards.
+
+    Returns:
+        dic: for each of PARTITIONED_SECTIONS, the list of names the
+        matching function of contact.py returns, in no particular order.
+    """
+    partials = [{**_load(_path(work_dir, "counted", shard)),
+                 **_load(_path(work_dir, "classified", shard))}
+                for shard in range(num_partitions)]
+
+    results = {section: [name for partial in partials
+                         for name in partial[section]]
+               for section in (5, 6, 7, 11, 12, 13)}
+
+    # only the shards that reach the overall maximum contribute
+    for section, key in ((8, "max_out_degree"), (9, "max_in_degree")):
+        maximum = max(partial[key] for partial in partials)
+        results[section] = [name for partial in partials
+                            if partial[key] == maximum
+                            for name in partial[section]]
+    return results
+
+
+def analyse_partitioned(file_name, num_partitions, workers=None,
+                        work_dir=None, on_error=None):
+    """Run every phase of the job locally in a pool of processes.
+
+    Args:
+        file_name (str): name of the contact file.
+        num_partitions (int): number of shards. The file is also mapped in
+        this many byte ranges.
+        workers (int): number of processes. Defaults to one per CPU.
+        work_dir (str): where the shard files are exchanged. Defaults to
+        the system's temporary directory.
+        on_error (callable): called for every line that cannot be read.
+
+    Returns:
+        dic: the merged results, as returned by reduce_partials.
+    """
+    ranges = split_byte_ranges(file_name, num_partitions)
+    starts = [start for start, _ in ranges]
+    ends = [end for _, end in ranges]
+    shards = range(num_partitions)
+
+    with tempfile.TemporaryDirectory(prefix="contact-shards-",
+                                     dir=work_dir) as directory, \
+            ProcessPoolExecutor(workers) as pool:
+        common = repeat(directory), repeat(num_partitions)
+
+        # each phase reads what the whole previous phase wrote, so it only
+        # starts once every task of that phase is done
+        num_errors = sum(pool.map(map_records, repeat(file_name), *common,
+                                  range(len(ranges)), starts, ends))
+        list(pool.map(group_records, *common, shards, repeat(len(ranges))))
+        list(pool.map(count_contacts, *common, shards))
+        list(pool.map(classify_patients, *common, shards))
+        results = reduce_partials(directory, num_partitions)
+
+    if on_error is not None:
+        for _ in range(num_errors):
+            on_error()
+    return results
+
+
+# Run some tests if the module has not been imported
+if __name__ == "__main__":
+    import random
+
+    import contact
+
+    # Write random contact files, with repeated patients and cycles, and
+    # compare what the partitioned job finds with the find_* functions run
+    # on the parsed dictionary, for several numbers of shards.
+    rng = random.Random(2024)
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "contacts.txt")
+        for trial in range(20):
+            people = [f"p{i}" for i in range(rng.randint(1, 40))]
+            with open(file_name, 'w') as file:
+                for _ in range(rng.randint(1, 60)):
+                    names = rng.choices(people, k=rng.randint(1, 5))
+                    file.write(",".join(names) + "\n")
+
+            contacts_dic = contact.parse_file(file_name)
+            zombies = contact.find_potential_zombies(contacts_dic)
+            patients_zero = contact.find_patients_zero(contacts_dic)
+            expected = {
+                5: patients_zero,
+                6: zombies,
+                7: contact.find_not_zombie_nor_zero(
+                    contacts_dic, patients_zero, zombies),
+                8: contact.find_most_viral(contacts_dic),
+                9: contact.find_most_contacted(contacts_dic),
+            }
+            expected.update(zip((11, 12, 13), contact.classify_zombies(
+                contacts_dic, zombies)))
+
+            for num_partitions in (1, 3, 7):
+                results = analyse_partitioned(file_name, num_partitions, 2)
+                for section in PARTITIONED_SECTIONS:
+                    assert (sorted(results[section])
+                            == sorted(expected[section])), \
+                        f"section {section} with {num_partitions} shards"
+
+    print("analyse_partitioned matches recomputation on", trial + 1,
+          "random files")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Measure each numbered section of contact.py: wall time, CPU time, peak
+traced memory and the number of items going in and out.
+
+main wraps every section in profiler.section(...). When profiling is off the
+profiler is NULL_PROFILER, whose sections do nothing, so an ordinary run
+pays for one no-op context manager per section and nothing else.
+"""
+
+import json
+import time
+import tracemalloc
+
+
+class _Section:
+    """Timing record for one section. Set items_out before it ends."""
+
+    def __init__(self, profiler, label, items_in):
+        self.profiler = profiler
+        self.label = label
+        self.items_in = items_in
+        self.items_out = None
+
+    def __enter__(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self.start_memory = tracemalloc.get_traced_memory()[0]
+        self.start_cpu = time.process_time()
+        self.start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.process_time() - self.start_cpu
+        record = {
+            "section": self.label,
+            "wall_seconds": wall,
+            "cpu_seconds": cpu,
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+        }
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            record["peak_bytes"] = peak - self.start_memory
+            record["retained_bytes"] = current - self.start_memory
+        self.profiler.sections.append(record)
+        return False
+
+
+class SectionProfiler:
+    """Collect a record for every section run inside section().
+
+    Attributes:
+        sections (list): one dictionary per finished section, in the order
+        they finished.
+        trace_memory (bool): whether tracemalloc peaks are recorded.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.sections = []
+        self.trace_memory = trace_memory
+        self._started_tracing = False
+
+    def start(self):
+        """Start tracing allocations, if wanted and not already running."""
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._start_wall = time.perf_counter()
+
+    def stop(self):
+        """Stop any tracing that start() began."""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def section(self, label, items_in=None):
+        """Return a context manager that measures one section.
+
+        Args:
+            label (int or str): the section number or name.
+            items_in (int): number of items the section reads.
+
+        Returns:
+            context manager: its value has an items_out attribute for the
+            number of items the section produced.
+        """
+        return _Section(self, label, items_in)
+
+    def report(self):
+        """Return every section record and the total time as a dictionary."""
+        return {
+            "sections": self.sections,
+            "total_wall_seconds": time.perf_counter() - self._start_wall,
+        }
+
+    def write_report(self, file):
+        """Write the report as JSON to an open text file."""
+        json.dump(self.report(), file, indent=2)
+        file.write("\n")
+
+
+class _NullSection:
+    """Section that measures nothing and accepts items_out."""
+
+    items_out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _NullProfiler:
+    """Profiler used when profiling is off."""
+
+    _section = _NullSection()
+
+    def section(self, label, items_in=None):
+        return self._section
+
+
+NULL_PROFILER = _NullProfiler()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""Cache finished reports on disk, keyed by the content of the input file
+and the version of the analysis code, so an unchanged dataset is reported
+without being analysed again.
+
+The code version is a digest of the source of every module that shapes the
+report, so editing any of them invalidates all earlier entries. Entries are
+evicted least recently used first once the cache grows past its size bound.
+"""
+
+import hashlib
+import os
+import shutil
+from contextlib import contextmanager
+
+from contact_io import file_digest
+
+# Modules whose source decides what a report contains.
+ANALYSIS_MODULES = ("contact.py", "contact_external.py", "contact_graph.py",
+                    "contact_io.py", "contact_numpy.py",
+                    "contact_partition.py", "format_list.py")
+DEFAULT_MAX_BYTES = 256 << 20
+ENTRY_SUFFIX = ".report"
+
+
+def default_cache_directory():
+    """Return $CONTACT_RESULT_CACHE, or a directory in the user's cache."""
+    return os.environ.get("CONTACT_RESULT_CACHE") or os.path.join(
+        os.path.expanduser("~"), ".cache", "contact_tracing", "results")
+
+
+def analysis_code_version():
+    """Return a digest of the source of every analysis module.
+
+    Returns:
+        str: hex digest that changes whenever any of ANALYSIS_MODULES does.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for module in ANALYSIS_MODULES:
+        digest.update(module.encode() + b"\0")
+        try:
+            with open(os.path.join(directory, module), 'rb') as file:
+                digest.update(file.read())
+        except OSError:
+            digest.update(b"missing")
+    return digest.hexdigest()
+
+
+class _Tee:
+    """Text stream that copies every write to several streams."""
+
+    def __init__(self, *streams):
+        self.streams = streams
+
+    def write(self, text):
+        for stream in self.streams:
+            stream.write(text)
+        return len(text)
+
+    def writelines(self, lines):
+        lines = list(lines)         # may be a generator, read only once
+        for stream in self.streams:
+            stream.writelines(lines)
+
+    def flush(self):
+        for stream in self.streams:
+            stream.flush()
+
+
+class ResultCache:
+    """Directory of finished reports with a size bound and LRU eviction.
+
+    Attributes:
+        directory (str): where the entries are kept.
+        max_bytes (int): total size the entries are trimmed back to.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or default_cache_directory()
+        self.max_bytes = max_bytes
+        self._code_version = analysis_code_version()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, file_name, sections=None):
+        """Return the cache key for the report on a contact file. The
+        backend, worker count and graph cache do not change the report, so
+        they are not part of the key.
+
+        Args:
+            file_name (str): name of the contact file.
+            sections (set): the sections printed, or None for all of them.
+
+        Returns:
+            str: hex digest of the file's content, the code version and the
+            sections.
+        """
+        digest = hashlib.blake2b(file_digest(file_name), digest_size=20)
+        digest.update(self._code_version.encode())
+        if sections is not None:
+            digest.update(",".join(map(str, sorted(sections))).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        """Return the name of the cached report for key, or None. A hit
+        marks the entry as recently used."""
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def copy_to(self, key, out):
+        """Write the cached report for key to an open text stream.
+
+        Returns:
+            bool: False if there is no entry for key.
+        """
+        path = self.get(key)
+        if path is None:
+            return False
+        try:
+            with open(path, encoding='utf-8') as report:
+                shutil.copyfileobj(report, out, 1 << 20)
+        except FileNotFoundError:   # evicted by another process meanwhile
+            return False
+        return True
+
+    @contextmanager
+    def writing(self, key, also=None):
+        """Open a new entry for key. The entry only becomes visible if the
+        block finishes without an exception.
+
+        Args:
+            key (str): key of the entry.
+            also (stream): a text stream that gets a copy of everything
+            written, so the report reaches it even if the entry is evicted
+            by another process before it could be read back.
+
+        Yields:
+            stream: a text stream to write the report to.
+        """
+        temp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as out:
+                yield out if also is None else _Tee(out, also)
+            os.replace(temp_path, self._path(key))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """Remove least recently used entries until the cache fits within
+        max_bytes.
+
+        Args:
+            keep (str): key of an entry that is never removed, so a report
+            larger than the whole cache can still be read back once.
+        """
+        kept = None if keep is None else self._path(keep)
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(ENTRY_SUFFIX):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    total += stat.st_size
+                    if entry.path != kept:
+                        entries.append((stat.st_mtime_ns, stat.st_size,
+                                        entry.path))
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""Serve queries about one contact tracing dataset from memory.
+
+The dataset is parsed and indexed once. Clients then connect over a Unix
+socket (or localhost TCP) and send one JSON request per line, for example
+
+    {"op": "height", "name": "Bob"}
+    {"op": "is_potential_zombie", "names": ["Philip", "Sarai", "Bob"]}
+    {"op": "top_viral", "k": 3}
+
+and get one JSON response per line: {"ok": true, "result": ...} or
+{"ok": false, "error": "..."}. Requests naming a list of people get a list of
+results in the same order; a request line may be up to MAX_REQUEST_BYTES
+long. {"op": "reload"} rebuilds the index at once.
+The input file is also watched and the index is rebuilt in the background
+when it changes; queries keep being answered from the previous index until
+the new one is ready.
+
+Example:
+    python contact_server.py DataSet1.txt --socket /tmp/contact.sock
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+
+import contact
+from contact_graph import ContactGraph, DegreeRanking
+
+# Longest request line read, in bytes. Longer lines are answered with an
+# error and skipped.
+MAX_REQUEST_BYTES = 16 << 20
+
+
+class ContactIndex:
+    """Everything needed to answer queries about one dataset in constant or
+    logarithmic time.
+
+    Attributes:
+        file_name (str): the contact file the index was built from.
+        signature (tuple): the file's size and modification time when read.
+        graph (ContactGraph): the indexed contact lists.
+        patients_zero (frozenset): sick people nobody listed.
+        potential_zombies (frozenset): contacts without their own record.
+        zombie_types (dic): for each sick person, the zombie types they
+        belong to.
+        cycle_groups (list): the looping groups found by find_cycle_groups.
+        heights (dic): each person's maximum distance from a zombie. Members
+        of a cycle share the cycle's height.
+        viral_ranking (DegreeRanking): sick people ranked by contacts.
+        contacted_ranking (DegreeRanking): contacts ranked by appearances.
+    """
+
+    def __init__(self, file_name, use_cache=False):
+        """Parse and index a contact file.
+
+        Args:
+            file_name (str): name of the contact file.
+            use_cache (bool): use the binary graph cache, as for parse_file.
+        """
+        self.file_name = file_name
+        self.signature = file_signature(file_name)
+        contacts_dic = contact.parse_file(file_name, use_cache=use_cache,
+                                          out=sys.stderr)
+        graph = self.graph = ContactGraph(contacts_dic)
+
+        zombie_list = contact.find_potential_zombies(graph)
+        self.patients_zero = frozenset(contact.find_patients_zero(graph))
+        self.potential_zombies = frozenset(zombie_list)
+
+        self.zombie_types = {patient: [] for patient in graph.patients}
+        for zombie_type, patients in zip(
+                ("spreader", "regular", "predator"),
+                contact.classify_zombies(graph, zombie_list)):
+            for patient in patients:
+                self.zombie_types[patient].append(zombie_type)
+
+        self.cycle_groups = contact.find_cycle_groups(graph)
+        self.heights = contact.find_maximum_distance_from_zombie(graph,
+                                                                 zombie_list)
+
+        self.viral_ranking = DegreeRanking(graph.out_degree)
+        self.contacted_ranking = DegreeRanking(graph.in_degree)
+
+
+def file_signature(file_name):
+    """Return a file's size and modification time, to notice changes."""
+    stat = os.stat(file_name)
+    return stat.st_size, stat.st_mtime_ns
+
+
+# Queries about one person. Each takes the index and a name.
+
+def _viral_rank(index, name):
+    if name not in index.graph.out_degree:
+        return None
+    return index.viral_ranking.rank(name)
+
+
+def _contacted_rank(index, name):
+    if name not in index.graph.in_degree:
+        return None
+    return index.contacted_ranking.rank(name)
+
+
+NAME_QUERIES = {
+    "is_patient_zero": lambda index, name: name in index.patients_zero,
+    "is_potential_zombie":
+        lambda index, name: name in index.potential_zombies,
+    "is_sick": lambda index, name: name in index.graph.patients,
+    "zombie_types": lambda index, name: index.zombie_types.get(name),
+    "contacts": lambda index, name: index.graph.adjacency.get(name),
+    "listed_by": lambda index, name: index.graph.reverse.get(name, []),
+    "height": lambda index, name: index.heights.get(name),
+    "viral_rank": _viral_rank,
+    "contacted_rank": _contacted_rank,
+}
+
+# Queries about the whole dataset. Each takes the index and the request.
+
+DATASET_QUERIES = {
+    "top_viral": lambda index, request:
+        index.viral_ranking.top(int(request.get("k", 10))),
+    "top_contacted": lambda index, request:
+        index.contacted_ranking.top(int(request.get("k", 10))),
+    "cycle_groups": lambda index, request: index.cycle_groups,
+    "stats": lambda index, request: {
+        "file": index.file_name,
+        "patients": len(index.graph.patients),
+        "contacts": len(index.graph.contacts),
+        "patients_zero": len(index.patients_zero),
+        "potential_zombies": len(index.potential_zombies),
+        "cycle_groups": len(index.cycle_groups),
+    },
+}
+
+
+def answer(index, request):
+    """Answer one decoded request against an index.
+
+    Args:
+        index (ContactIndex): the dataset to query.
+        request (dic): has an "op" and, for queries about people, either a
+        "name" or a list of "names".
+
+    Returns:
+        the result of the query.
+
+    Raises:
+        KeyError: if the request is incomplete.
+        ValueError: if the operation is unknown or cannot be answered.
+    """
+    op = request["op"]
+    if op in NAME_QUERIES:
+        query = NAME_QUERIES[op]
+        if "names" in request:
+            return [query(index, name) for name in request["names"]]
+        return query(index, request["name"])
+    if op in DATASET_QUERIES:
+        return DATASET_QUERIES[op](index, request)
+    raise ValueError(f"unknown op {op!r}")
+
+
+class ContactServer:
+    """Hold the current index, answer clients and rebuild the index when the
+    input file changes.
+
+    Attributes:
+        file_name (str): the contact file being served.
+        index (ContactIndex): the index queries are answered from.
+    """
+
+    def __init__(self, file_name, use_cache=False, poll_interval=1.0):
+        """Build the first index.
+
+        Args:
+            file_name (str): name of the contact file.
+            use_cache (bool): use the binary graph cache when (re)loading.
+            poll_interval (float): seconds between checks of the file.
+        """
+        self.file_name = file_name
+        self.use_cache = use_cache
+        self.poll_interval = poll_interval
+        self.index = ContactIndex(file_name, use_cache)
+        self._reloading = None
+
+    async def respond(self, line):
+        """Answer one request line and return the response line. A
+        {"op": "reload"} request rebuilds the index before answering."""
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise TypeError("a request must be a JSON object")
+            if request.get("op") == "reload":
+                await self.reload()
+                result = None
+            else:
+                result = answer(self.index, request)
+            response = {"ok": True, "result": result}
+        except (KeyError, TypeError, ValueError, OSError) as error:
+            response = {"ok": False,
+                        "error": f"{type(error).__name__}: {error}"}
+        return json.dumps(response).encode() + b"\n"
+
+    async def handle_client(self, reader, writer):
+        """Answer requests from one client until it disconnects."""
+        try:
+            while line := await read_request(reader):
+                if line is TOO_LONG:
+                    response = {"ok": False, "error": "request longer than "
+                                f"{MAX_REQUEST_BYTES} bytes"}
+                    writer.write(json.dumps(response).encode() + b"\n")
+                else:
+                    writer.write(await self.respond(line))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def reload(self):
+        """Rebuild the index in a worker thread and swap it in. Concurrent
+        calls share one rebuild."""
+        if self._reloading is None:
+            self._reloading = asyncio.ensure_future(asyncio.to_thread(
+                ContactIndex, self.file_name, self.use_cache))
+        try:
+            self.index = await self._reloading
+        finally:
+            self._reloading = None
+
+    async def watch(self):
+        """Reload whenever the file's size or modification time changes."""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                changed = file_signature(self.file_name) != \
+                    self.index.signature
+            except OSError:
+                continue            # the file is being replaced
+            if changed:
+                try:
+                    await self.reload()
+                except (OSError, ValueError) as error:
+                    print(f"Reload failed: {error}", file=sys.stderr)
+
+    async def serve(self, socket_path=None, port=None):
+        """Listen on a Unix socket or a localhost TCP port until
+        cancelled."""
+        if socket_path is not None:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            server = await asyncio.start_unix_server(
+                self.handle_client, socket_path, limit=MAX_REQUEST_BYTES)
+        else:
+            server = await asyncio.start_server(
+                self.handle_client, "127.0.0.1", port,
+                limit=MAX_REQUEST_BYTES)
+
+        watcher = asyncio.ensure_future(self.watch())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            if socket_path is not None and os.path.exists(socket_path):
+                os.remove(socket_path)
+
+
+# Returned by read_request in place of a line that was too long.
+TOO_LONG = object()
+
+
+async def read_request(reader):
+    """Read one request line from a client.
+
+    Returns:
+        bytes: the line, or b"" once the client has disconnected. A line
+        longer than the reader's limit is skipped and TOO_LONG is returned
+        in its place, so the client can be answered and keep its
+        connection.
+    """
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as error:
+        return error.partial        # a last line without a newline
+    except asyncio.LimitOverrunError as error:
+        consumed = error.consumed
+
+    # drop the line a buffer at a time, up to and including its newline
+    while True:
+        await reader.readexactly(consumed)
+        try:
+            await reader.readuntil(b"\n")
+            return TOO_LONG
+        except asyncio.IncompleteReadError:
+            return TOO_LONG
+        except asyncio.LimitOverrunError as error:
+            consumed = error.consumed
+
+
+def send_query(request, socket_path=None, port=None):
+    """Send one request to a running server and return its response.
+
+    Args:
+        request (dic): the request, as described in the module docstring.
+        socket_path (str): the server's Unix socket.
+        port (int): the server's localhost TCP port, if no socket_path.
+
+    Returns:
+        dic: the decoded response.
+    """
+    if socket_path is not None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(socket_path)
+    else:
+        connection = socket.create_connection(("127.0.0.1", port))
+
+    with connection, connection.makefile('rwb') as stream:
+        stream.write(json.dumps(request).encode() + b"\n")
+        stream.flush()
+        return json.loads(stream.readline())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve queries about a contact file from memory.")
+    parser.add_argument("infile")
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument("--socket", help="path of the Unix socket to create")
+    where.add_argument("--port", type=int, help="localhost TCP port")
+    parser.add_argument("--cache", action="store_true",
+                        help="use the binary graph cache when loading")
+    parser.add_argument("--poll", type=float, default=1.0,
+                        help="seconds between checks for a changed file")
+    args = parser.parse_args()
+
+    if not contact.file_exists(args.infile):
+        print("File does not exist, ending program.")
+        sys.exit(1)
+
+    server = ContactServer(args.infile, args.cache, args.poll)
+    # stop cleanly on SIGTERM too, so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        asyncio.run(server.serve(args.socket, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,14 @@
 """Format a list of items so that they are comma separated and "and" appears before the last item.
 """
 
-def format_list(data):
+def format_list(data, presorted=False):
     """Format a list of items so that they are comma separated and "and"
     appears before the last item.
 
     Args:
         data (list): the list of items to format
+        presorted (bool): True if data is already sorted, so it is not
+        sorted again
 
     Returns:
         str: A string containing the items from data with nice formatting
@@ -16,23 +18,16 @@ def format_list(data):
     if len(data) == 0:
         return "(None)"
 
-    # Start with an empty string that we will add items to
-    retval = ""
+    sorted_data = data if presorted else sorted(data)
+    items = [str(item) for item in sorted_data]
 
-    sorted_data = sorted(data)
-    # Handle all of the items except for the last two
-    for i in range(0, len(sorted_data) - 2):
-        retval = retval + str(sorted_data[i]) + ", "
+    # Handle a single item
+    if len(items) == 1:
+        return items[0]
 
-    # Handle the second last item
-    if len(sorted_data) >= 2:
-        retval += str(sorted_data[-2]) + " and "
-
-    # Handle the last item
-    retval += str(sorted_data[-1])
-
-    # Return the result
-    return retval
+    # Join all of the items except for the last one in a single pass, then
+    # put "and" before the last item
+    return ", ".join(items[:-1]) + " and " + items[-1]
 
 # Run some tests if the module has not been imported
 if __name__ == "__main__":
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Generate synthetic contact tracing files of a chosen size and shape, for
+testing how each section of contact.py scales.
+
+Sick person i is named P followed by i as eight digits. Contacts are drawn
+from later people only, so the data has no cycles unless they are planted
+explicitly. About a fifth of the names are people who only appear in contact
+lists (potential zombies).
+"""
+
+import argparse
+import random
+
+SHAPES = ("chain", "fanout", "powerlaw")
+
+
+def person_name(i):
+    """Return the name used for person number i."""
+    return f"P{i:08d}"
+
+
+def generate_contacts(num_records, shape="powerlaw", num_cycles=0,
+                      seed=None):
+    """Generate a contact dictionary.
+
+    Args:
+        num_records (int): number of sick people.
+        shape (str): "chain" for one long transmission chain, "fanout" for
+        shallow records with many contacts each, or "powerlaw" for contact
+        list lengths with a heavy tail.
+        num_cycles (int): number of two-person loops to plant.
+        seed (int): seed for the random generator, for repeatable data.
+
+    Returns:
+        dic: each entry is a sick person's name and their list of contacts.
+    """
+    rng = random.Random(seed)
+    num_people = num_records + max(1, num_records // 4)
+    contacts = {}
+
+    for i in range(num_records):
+        later = num_people - i - 1
+        if shape == "chain":
+            # one step down the chain, with an occasional shortcut
+            targets = [i + 1]
+            if rng.random() < 0.2:
+                targets.append(i + rng.randint(2, 10))
+        elif shape == "fanout":
+            targets = [i + rng.randint(1, later) for _ in
+                       range(rng.randint(10, 40))]
+        elif shape == "powerlaw":
+            degree = min(int(rng.paretovariate(1.2)), 1000)
+            # nearby people are much more likely to be contacted
+            targets = [i + 1 + int(later * rng.random() ** 4)
+                       for _ in range(degree)]
+        else:
+            raise ValueError(f"unknown shape {shape!r}")
+
+        contacts[person_name(i)] = [person_name(min(target, num_people - 1))
+                                    for target in targets]
+
+    for _ in range(min(num_cycles, num_records // 2)):
+        first, second = rng.sample(range(num_records), 2)
+        contacts[person_name(first)].append(person_name(second))
+        contacts[person_name(second)].append(person_name(first))
+
+    return contacts
+
+
+def write_contacts(file_name, contacts_dic, malformed_rate=0.0, seed=None):
+    """Write a contact dictionary in the format parse_file reads.
+
+    Args:
+        file_name (str): name of the file to create.
+        contacts_dic (dic): each entry is a sick person's name and their list
+        of contacts.
+        malformed_rate (float): fraction of records followed by a malformed
+        line: blank, not valid UTF-8, or carrying trailing whitespace.
+        seed (int): seed for choosing where malformed lines go.
+    """
+    rng = random.Random(seed)
+    malformed = (b"\n", b"\xff\xfe,\xfd\n", b"   \t\n")
+
+    with open(file_name, 'wb') as file:
+        for patient, contacts_list in contacts_dic.items():
+            file.write(",".join([patient, *contacts_list]).encode() + b"\n")
+            if malformed_rate and rng.random() < malformed_rate:
+                file.write(rng.choice(malformed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("outfile", help="name of the file to create")
+    parser.add_argument("-n", "--records", type=int, default=10000,
+                        help="number of sick people")
+    parser.add_argument("--shape", choices=SHAPES, default="powerlaw")
+    parser.add_argument("--cycles", type=int, default=0,
+                        help="number of two-person loops to plant")
+    parser.add_argument("--malformed", type=float, default=0.0,
+                        help="fraction of records followed by a bad line")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    contacts_dic = generate_contacts(args.records, args.shape, args.cycles,
+                                     args.seed)
+    write_contacts(args.outfile, contacts_dic, args.malformed, args.seed)
+
+
+if __name__ == "__main__":
+    main()